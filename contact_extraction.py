@@ -0,0 +1,98 @@
+import re
+import resume_sections
+
+# Deterministic contact extraction. Email, phone, LinkedIn and GitHub URLs and a labelled or
+# "City, ST" style location are found with compiled regexes over the top of the resume and the
+# PDF's link annotations, so the model is not asked for fields a regex gets right every time.
+EMAIL_PATTERN = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+PHONE_PATTERN = re.compile(r"(?<![\w+])(\+?\d{1,3}[\s.-]?)?(\(\d{1,4}\)[\s.-]?)?\d{2,4}(?:[\s.-]?\d{2,4}){2,4}(?!\w)")
+LINKEDIN_PATTERN = re.compile(r"(?:https?://)?(?:[a-z]{2,3}\.)?linkedin\.com/in/[A-Za-z0-9_%-]+", re.IGNORECASE)
+GITHUB_PATTERN = re.compile(r"(?:https?://)?(?:www\.)?github\.com/(?!features|about|pricing|orgs|topics|sponsors)[A-Za-z0-9](?:[A-Za-z0-9-]{0,38})", re.IGNORECASE)
+YEAR_RANGE_PATTERN = re.compile(r"^(?:19|20)\d{2}\s*[-.]\s*(?:19|20)\d{2}$")
+LOCATION_LABEL_PATTERN = re.compile(r"^\s*(?:location|address|based in|city)\s*[:\-]\s*(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+CITY_STATE_PATTERN = re.compile(r"^[A-Z][A-Za-z.'\- ]{1,30},\s*[A-Z]{2}(?:\s+\d{5}(?:-\d{4})?)?$")
+CITY_COUNTRY_PATTERN = re.compile(r"^[A-Z][A-Za-z.'\- ]{1,30},\s*[A-Z][A-Za-z ]{2,30}$")
+HEADER_SEPARATORS = re.compile(r"\s*[|•·●–\t]\s*|\s{3,}")
+
+# Only the top of a resume holds contact details; bounding the scan keeps it under a millisecond
+HEADER_CHARS = 2000
+HEADER_LINES = 12
+
+def _url(match: str) -> str:
+    match = match.rstrip("/")
+    return match if match.lower().startswith("http") else f"https://{match}"
+
+def find_phone(text: str) -> str:
+    for match in PHONE_PATTERN.finditer(text):
+        phone = match.group(0).strip()
+        digits = sum(char.isdigit() for char in phone)
+        if YEAR_RANGE_PATTERN.match(phone):
+            continue
+        # Short digit runs are dates or postcodes unless written like a phone number
+        if 9 <= digits <= 15 or (7 <= digits <= 15 and (phone.startswith("+") or "(" in phone)):
+            return phone
+    return ""
+
+def find_location(header: str) -> str:
+    match = LOCATION_LABEL_PATTERN.search(header)
+    if match:
+        return match.group(1)
+
+    # The first line is usually the name, so "Doe, Jane" is never taken for a location. A
+    # "City, Country" part is only trusted on a contact line (one with an email, phone or separated
+    # fields), since "Software Engineer, Microsoft" or "Python, Django" have the same shape.
+    for line in header.splitlines()[1:HEADER_LINES]:
+        if resume_sections.classify_heading(line):
+            break
+        parts = HEADER_SEPARATORS.split(line.strip())
+        contact_line = len(parts) > 1 or bool(EMAIL_PATTERN.search(line)) or bool(find_phone(EMAIL_PATTERN.sub(" ", line)))
+        for part in parts:
+            if EMAIL_PATTERN.search(part) or any(char.isdigit() for char in part.split(",")[0]):
+                continue
+            if CITY_STATE_PATTERN.match(part) or (contact_line and CITY_COUNTRY_PATTERN.match(part)):
+                return part
+    return ""
+
+def extract_contacts(text: str, links=None) -> dict:
+    """
+    Contact fields found in the resume header and link annotations. Only fields that were found are
+    returned, from: email, phone, linkedin, github, location.
+    """
+    header = text[:HEADER_CHARS]
+    contacts = {}
+
+    # Link annotations hold the exact target even when the visible text is just "LinkedIn"
+    for uri in links or ():
+        if uri.lower().startswith("mailto:") and "email" not in contacts:
+            email = EMAIL_PATTERN.search(uri)
+            if email:
+                contacts["email"] = email.group(0)
+        elif uri.lower().startswith("tel:") and "phone" not in contacts:
+            contacts["phone"] = uri[4:].strip()
+        elif "linkedin" not in contacts and LINKEDIN_PATTERN.search(uri):
+            contacts["linkedin"] = _url(LINKEDIN_PATTERN.search(uri).group(0))
+        elif "github" not in contacts and GITHUB_PATTERN.search(uri):
+            contacts["github"] = _url(GITHUB_PATTERN.search(uri).group(0))
+
+    if "email" not in contacts:
+        email = EMAIL_PATTERN.search(header)
+        if email:
+            contacts["email"] = email.group(0)
+    if "linkedin" not in contacts:
+        linkedin = LINKEDIN_PATTERN.search(header)
+        if linkedin:
+            contacts["linkedin"] = _url(linkedin.group(0))
+    if "github" not in contacts:
+        github = GITHUB_PATTERN.search(header)
+        if github:
+            contacts["github"] = _url(github.group(0))
+    if "phone" not in contacts:
+        phone = find_phone(EMAIL_PATTERN.sub(" ", header))
+        if phone:
+            contacts["phone"] = phone
+
+    location = find_location(header)
+    if location:
+        contacts["location"] = location
+
+    return contacts
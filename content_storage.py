@@ -0,0 +1,124 @@
+import os
+import base64
+import hashlib
+import logging
+import threading
+import zstandard
+
+# Storage of the extracted resume text. The text is by far the largest part of a resume document,
+# so by default it is kept out of the Cosmos item: "blob" writes it zstd-compressed to a blob named
+# after the document id and the compressed bytes, "compressed" keeps it in the item as a base64
+# zstd field the indexing policy excludes (see cosmos_provisioning.py), and "inline" is the
+# original plain metadata.originalContent field. load_content reads all three, so documents written under an
+# earlier mode stay readable.
+#
+# Resumes are short and share most of their vocabulary, so when CONTENT_ZSTD_DICTIONARY names a
+# dictionary trained by train_content_dictionary.py, texts are compressed with it. Dictionaries are
+# immutable blobs in the content container, and each document records the version it was written
+# with, so rolling out a new dictionary never breaks reading older documents.
+CONTENT_FIELD = "originalContent"
+COMPRESSED_CONTENT_FIELD = "originalContentZstd"
+DICTIONARY_PREFIX = "dictionaries/"
+
+_dictionaries_lock = threading.Lock()
+_dictionaries = {}
+
+def get_content_storage_mode() -> str:
+    return os.environ.get("CONTENT_STORAGE_MODE", "blob").lower()
+
+def get_compression_level() -> int:
+    return int(os.environ.get("CONTENT_ZSTD_LEVEL", "10"))
+
+def get_dictionary_version() -> str:
+    return os.environ.get("CONTENT_ZSTD_DICTIONARY", "")
+
+def dictionary_blob_name(version: str) -> str:
+    return f"{DICTIONARY_PREFIX}{version}.zdict"
+
+def get_dictionary(version: str, get_blob_container) -> zstandard.ZstdCompressionDict:
+    """
+    Dictionary `version` from the content container, loaded once per process
+    """
+    with _dictionaries_lock:
+        if version in _dictionaries:
+            return _dictionaries[version]
+
+    data = get_blob_container().get_blob_client(dictionary_blob_name(version)).download_blob().readall()
+    dictionary = zstandard.ZstdCompressionDict(data)
+
+    with _dictionaries_lock:
+        return _dictionaries.setdefault(version, dictionary)
+
+def compress_text(text: str, dictionary: zstandard.ZstdCompressionDict = None) -> bytes:
+    # Compressor objects are not thread-safe; they are cheap enough to create per call
+    return zstandard.ZstdCompressor(level=get_compression_level(), dict_data=dictionary).compress(text.encode("utf-8"))
+
+def decompress_text(data: bytes, dictionary: zstandard.ZstdCompressionDict = None) -> str:
+    return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(data).decode("utf-8")
+
+def _write_dictionary(get_blob_container):
+    """
+    (version, dictionary) to compress new texts with, or ("", None) when none is configured or it
+    cannot be loaded
+    """
+    version = get_dictionary_version()
+    if not version or not get_blob_container:
+        return "", None
+    try:
+        return version, get_dictionary(version, get_blob_container)
+    except Exception as e:
+        # The dictionary only improves the ratio; never fail an ingest because of it
+        logging.warning(f"Content dictionary {version} unavailable, compressing without it: {str(e)}")
+        return "", None
+
+def content_blob_name(document_id: str, compressed: bytes) -> str:
+    """
+    Blob name of a compressed text. It includes a digest of the compressed bytes, so uploading
+    before the Cosmos write can never overwrite the blob another write of the same id (e.g. with a
+    different dictionary or level) still points at.
+    """
+    return f"{document_id}/{hashlib.sha256(compressed).hexdigest()[:16]}.txt.zst"
+
+def attach_content(document: dict, text: str, mode: str = None, get_blob_container=None):
+    """
+    Record `text` on `document` according to `mode`. In "blob" mode the compressed bytes are
+    returned for the caller to upload as metadata.contentStorage.blob; otherwise returns None.
+    `get_blob_container()` is used to load the configured dictionary.
+    """
+    mode = mode or get_content_storage_mode()
+    metadata = document["metadata"]
+
+    if mode == "inline":
+        metadata[CONTENT_FIELD] = text
+        return None
+
+    version, dictionary = _write_dictionary(get_blob_container)
+    compressed = compress_text(text, dictionary)
+    metadata["contentStorage"] = {"mode": mode, "codec": "zstd", "compressedLength": len(compressed)}
+    if version:
+        metadata["contentStorage"]["dictionary"] = version
+    if mode == "compressed":
+        metadata[COMPRESSED_CONTENT_FIELD] = base64.b64encode(compressed).decode("ascii")
+        return None
+
+    metadata["contentStorage"]["blob"] = content_blob_name(document["id"], compressed)
+    return compressed
+
+def load_content(document: dict, get_blob_container=None) -> str:
+    """
+    Resume text of a stored document. `get_blob_container()` is only called when the text or its
+    dictionary is in blob storage.
+    """
+    metadata = document.get("metadata", {})
+    if CONTENT_FIELD in metadata:
+        return metadata[CONTENT_FIELD]
+
+    storage = metadata.get("contentStorage", {})
+    dictionary = get_dictionary(storage["dictionary"], get_blob_container) if storage.get("dictionary") else None
+    if COMPRESSED_CONTENT_FIELD in metadata:
+        return decompress_text(base64.b64decode(metadata[COMPRESSED_CONTENT_FIELD]), dictionary)
+
+    if not storage or not get_blob_container:
+        return ""
+    blob = get_blob_container().get_blob_client(storage["blob"])
+    return decompress_text(blob.download_blob().readall(), dictionary)
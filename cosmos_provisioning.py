@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import uuid
+import logging
+import argparse
+from azure.cosmos import CosmosClient, PartitionKey
+from azure.cosmos.exceptions import CosmosHttpResponseError
+import partitioning
+
+# Indexing policy of the resumes container, declared in code. Only the paths our queries filter or
+# sort on are indexed ("/*" is excluded), which cuts the write RUs and index storage of every
+# document; the stored resume text (see content_storage.py) is excluded explicitly as well so it
+# stays unindexed even if "/*" is ever included again. The script diffs the declared policy
+# against the live container, applies it, and can measure query and write RUs, e.g. against the
+# Cosmos DB emulator before and after applying.
+#
+#   python cosmos_provisioning.py                       # show the diff
+#   python cosmos_provisioning.py --apply --wait
+#   python cosmos_provisioning.py --emulator --measure  # COSMOS_KEY holds the emulator key
+CONTENT_EXCLUDED_PATHS = ["/metadata/originalContent/?", "/metadata/originalContentZstd/?"]
+
+INDEXED_PATHS = [
+    # Partition keys of every scheme (see partitioning.py)
+    "/partition_key/?",
+    "/tenant/?",
+    "/status/?",
+    # Dedup lookups
+    "/metadata/contentHash/?",
+    "/metadata/fileUrl/?",
+    "/metadata/uploadTimestamp/?",
+    # Search filters
+    "/tags/?",
+    "/searchable_text/?",
+    "/personalInfo/name/?",
+    "/personalInfo/email/?",
+    "/personalInfo/location/?",
+    "/experience/total_years/?",
+    "/experience/current_role/?",
+    "/experience/industries/[]/?",
+    "/certifications/[]/?",
+    # JOIN skill IN c.skills.technical_skills WHERE skill.skill = ... AND skill.proficiency = ...
+    "/skills/technical_skills/[]/skill/?",
+    "/skills/technical_skills/[]/proficiency/?",
+    "/skills/technical_skills/[]/years/?",
+    "/skills/soft_skills/[]/?"
+]
+
+# A composite index serves an equality filter on its leading paths combined with a range filter or
+# ORDER BY on the last one, so the equality path comes first
+COMPOSITE_INDEXES = [
+    [("/tags", "ascending"), ("/experience/total_years", "descending")],
+    [("/personalInfo/location", "ascending"), ("/experience/total_years", "descending")],
+    [("/experience/current_role", "ascending"), ("/experience/total_years", "descending")],
+    [("/experience/total_years", "descending"), ("/metadata/uploadTimestamp", "descending")]
+]
+
+# Representative queries from the README for --measure
+BENCHMARK_QUERIES = {
+    "tags": "SELECT * FROM c WHERE CONTAINS(c.tags, 'external')",
+    "searchable_text": "SELECT * FROM c WHERE CONTAINS(c.searchable_text, 'python')",
+    "senior": "SELECT * FROM c WHERE c.experience.total_years >= 5 AND CONTAINS(c.searchable_text, 'senior')",
+    "tags_and_years": "SELECT * FROM c WHERE c.tags = 'external' AND c.experience.total_years >= 5",
+    "years_ordered": "SELECT * FROM c WHERE c.experience.total_years >= 3 ORDER BY c.experience.total_years DESC, c.metadata.uploadTimestamp DESC",
+    "industry": "SELECT * FROM c WHERE ARRAY_CONTAINS(c.experience.industries, 'Technology')",
+    "skill_join": "SELECT VALUE c.id FROM c JOIN skill IN c.skills.technical_skills WHERE skill.skill = 'Python' AND skill.proficiency = 'Expert'",
+    "content_hash": "SELECT TOP 1 * FROM c WHERE c.metadata.contentHash = 'benchmark'"
+}
+
+EMULATOR_ENDPOINT = "https://localhost:8081/"
+
+def declared_indexing_policy() -> dict:
+    return {
+        "indexingMode": "consistent",
+        "automatic": True,
+        "includedPaths": [{"path": path} for path in INDEXED_PATHS],
+        "excludedPaths": [{"path": path} for path in ["/*", '/"_etag"/?'] + CONTENT_EXCLUDED_PATHS],
+        "compositeIndexes": [[{"path": path, "order": order} for path, order in composite] for composite in COMPOSITE_INDEXES]
+    }
+
+def _normalize(policy: dict) -> dict:
+    """
+    Comparable form of an indexing policy; the service adds defaults (index kinds, "ascending")
+    that the declared policy leaves out
+    """
+    return {
+        "indexingMode": policy.get("indexingMode", "consistent").lower(),
+        "includedPaths": {entry["path"] for entry in policy.get("includedPaths", [])},
+        "excludedPaths": {entry["path"] for entry in policy.get("excludedPaths", [])},
+        "compositeIndexes": {tuple((entry["path"], entry.get("order", "ascending").lower()) for entry in composite) for composite in policy.get("compositeIndexes", [])}
+    }
+
+def diff_indexing_policy(live: dict, declared: dict) -> dict:
+    """
+    Changes from the `live` policy to the `declared` one, per field. Empty when they match.
+    """
+    live, declared = _normalize(live), _normalize(declared)
+    changes = {}
+    if live["indexingMode"] != declared["indexingMode"]:
+        changes["indexingMode"] = {"from": live["indexingMode"], "to": declared["indexingMode"]}
+    for field in ("includedPaths", "excludedPaths", "compositeIndexes"):
+        added = sorted(declared[field] - live[field])
+        removed = sorted(live[field] - declared[field])
+        if added or removed:
+            changes[field] = {"add": added, "remove": removed}
+    return changes
+
+def container_partition_key_of(properties: dict) -> PartitionKey:
+    """
+    PartitionKey matching a container's stored partitionKey definition, as replace_container needs it
+    """
+    definition = properties["partitionKey"]
+    paths = definition["paths"]
+    return PartitionKey(path=paths if len(paths) > 1 else paths[0], kind=definition.get("kind", "Hash"), version=definition.get("version", 2))
+
+def provision_indexing_policy(database, container_name: str, apply: bool = False) -> dict:
+    """
+    Diff the declared policy against the container's and, with `apply`, replace it. Creates the
+    container (e.g. on a fresh emulator) when it does not exist. Returns the diff.
+    """
+    container = database.get_container_client(container_name)
+    try:
+        properties = container.read()
+    except CosmosHttpResponseError as e:
+        if e.status_code != 404 or not apply:
+            raise
+        logging.info(f"Creating container {container_name}")
+        database.create_container(id=container_name, partition_key=partitioning.container_partition_key(), indexing_policy=declared_indexing_policy())
+        return {"created": True}
+
+    changes = diff_indexing_policy(properties["indexingPolicy"], declared_indexing_policy())
+    if changes and apply:
+        # replace_container resets settings it is not given, so carry the TTL over
+        database.replace_container(
+            container_name,
+            partition_key=container_partition_key_of(properties),
+            indexing_policy=declared_indexing_policy(),
+            default_ttl=properties.get("defaultTtl")
+        )
+        logging.info(f"Replaced the indexing policy of {container_name}")
+    return changes
+
+def wait_for_index_transformation(container, poll_seconds: float = 2.0, timeout_seconds: float = 600.0) -> bool:
+    """
+    Wait until the service has re-indexed the container after a policy change
+    """
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        container.read(populate_quota_info=True)
+        progress = int(container.client_connection.last_response_headers.get("x-ms-documentdb-collection-index-transformation-progress", 100))
+        if progress >= 100:
+            return True
+        logging.info(f"Index transformation {progress}% done")
+        time.sleep(poll_seconds)
+    return False
+
+def _request_charge(container) -> float:
+    return float(container.client_connection.last_response_headers.get("x-ms-request-charge", 0) or 0)
+
+def sample_document() -> dict:
+    """
+    A resume document shaped like build_resume_document's, for measuring write charges
+    """
+    document = {
+        "id": str(uuid.uuid4()),
+        "tags": "external,senior,fullstack",
+        "personalInfo": {"name": "Jane Doe", "email": "jane.doe@example.com", "phone": "(415) 555-0134", "location": "San Francisco, CA", "linkedin": "", "github": ""},
+        "skills": {
+            "technical_skills": [{"skill": skill, "proficiency": "Advanced", "years": 4} for skill in ("Python", "JavaScript", "React", "Docker", "Kubernetes", "PostgreSQL", "AWS", "Terraform")],
+            "soft_skills": ["Leadership", "Communication", "Mentoring"]
+        },
+        "experience": {
+            "total_years": 8,
+            "current_role": "Senior Software Engineer",
+            "industries": ["Technology", "Finance"],
+            "positions": [{"title": f"Software Engineer {number}", "start": "2016-01", "end": "2018-12", "months": 36} for number in range(4)]
+        },
+        "certifications": ["AWS Certified Solutions Architect"],
+        "searchable_text": " ".join(["jane doe python javascript react docker kubernetes postgresql aws terraform senior software engineer technology finance"] * 3),
+        "metadata": {"fileUrl": "https://example.sharepoint.com/resume.pdf", "filename": "resume.pdf", "contentLength": 4200, "contentHash": "benchmark", "uploadTimestamp": "2025-01-18T10:30:00", "aiProcessed": True}
+    }
+    return partitioning.apply_partition_key(document)
+
+def measure_request_units(container) -> dict:
+    """
+    Request charge of writing a sample document and of each benchmark query
+    """
+    document = sample_document()
+    container.create_item(document)
+    charges = {"write": _request_charge(container)}
+
+    try:
+        for name, query in BENCHMARK_QUERIES.items():
+            total = 0.0
+            for page in container.query_items(query=query, enable_cross_partition_query=True).by_page():
+                list(page)
+                total += _request_charge(container)
+            charges[name] = round(total, 2)
+    finally:
+        container.delete_item(item=document["id"], partition_key=partitioning.document_partition_key(document))
+    return charges
+
+def main():
+    parser = argparse.ArgumentParser(description="Provision the indexing policy of the resumes container")
+    parser.add_argument("--container", default=os.environ.get("COSMOS_CONTAINER_NAME", "resumes"))
+    parser.add_argument("--apply", action="store_true", help="replace the policy instead of only reporting the diff")
+    parser.add_argument("--wait", action="store_true", help="wait for re-indexing to finish after applying")
+    parser.add_argument("--measure", action="store_true", help="report the RU charge of a write and of the benchmark queries")
+    parser.add_argument("--emulator", action="store_true", help=f"connect to the local emulator at {EMULATOR_ENDPOINT} (self-signed certificate)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    endpoint = EMULATOR_ENDPOINT if args.emulator else os.environ.get("COSMOS_ENDPOINT")
+    key = os.environ.get("COSMOS_KEY")
+    if not endpoint or not key:
+        raise SystemExit("COSMOS_ENDPOINT and COSMOS_KEY must be set")
+
+    client = CosmosClient(endpoint, key, connection_verify=not args.emulator)
+    database_name = os.environ.get("COSMOS_DATABASE_NAME", "exploredb")
+    database = client.create_database_if_not_exists(database_name) if args.emulator else client.get_database_client(database_name)
+
+    changes = provision_indexing_policy(database, args.container, args.apply)
+    logging.info(f"Indexing policy diff: {json.dumps(changes, indent=2) if changes else 'none'}")
+
+    container = database.get_container_client(args.container)
+    if args.apply and changes and args.wait:
+        wait_for_index_transformation(container)
+    if args.measure:
+        logging.info(f"Request units: {json.dumps(measure_request_units(container))}")
+
+if __name__ == "__main__":
+    main()
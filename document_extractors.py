@@ -0,0 +1,234 @@
+import io
+import re
+import zipfile
+import xml.etree.ElementTree as ElementTree
+from html.parser import HTMLParser
+import pymupdf
+import pdf_workers
+
+# Registry of document text extractors, chosen by sniffing the leading bytes of the upload.
+# PDFs and images are opened with PyMuPDF (images go through the OCR path in pdf_workers);
+# DOCX, RTF, HTML and plain text have native extractors so they need no conversion upstream.
+_extractors = []
+
+def register_extractor(kind: str, content_type: str, sniff, extract, pymupdf_filetype: str = None):
+    """
+    Register an extractor. `sniff(data)` returns True when `data` is of this type and `extract(data)`
+    returns its plain text. Extractors are tried in registration order.
+    """
+    _extractors.append({
+        "kind": kind,
+        "content_type": content_type,
+        "sniff": sniff,
+        "extract": extract,
+        "pymupdf_filetype": pymupdf_filetype
+    })
+
+def detect_document_type(data: bytes) -> dict:
+    """
+    Return the registry entry matching `data`. Raises ValueError for unsupported documents.
+    """
+    for extractor in _extractors:
+        if extractor["sniff"](data):
+            return extractor
+    raise ValueError("Unsupported document type")
+
+def get_document_type(kind: str) -> dict:
+    for extractor in _extractors:
+        if extractor["kind"] == kind:
+            return extractor
+    raise ValueError(f"Unknown document type: {kind}")
+
+def extract_document_text(data: bytes, document_type: dict = None) -> str:
+    document_type = document_type or detect_document_type(data)
+    return document_type["extract"](data)
+
+def _extract_with_pymupdf(filetype: str):
+    def extract(data: bytes) -> str:
+        doc = pymupdf.Document(stream=data, filetype=filetype)
+        try:
+            return "".join(pdf_workers.page_text(page) for page in doc)
+        finally:
+            doc.close()
+    return extract
+
+def _leading_text(data: bytes, size: int = 512) -> str:
+    return data[:size].lstrip(b"\xef\xbb\xbf \t\r\n").decode("latin-1").lower()
+
+# DOCX: stream word/document.xml out of the zip and collect text runs without building a DOM
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+def _is_docx(data: bytes) -> bool:
+    if not data.startswith(b"PK\x03\x04"):
+        return False
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            return "word/document.xml" in archive.namelist()
+    except zipfile.BadZipFile:
+        return False
+
+def extract_docx_text(data: bytes) -> str:
+    parts = []
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        with archive.open("word/document.xml") as document_xml:
+            for event, element in ElementTree.iterparse(document_xml, events=("end",)):
+                tag = element.tag
+                if tag == f"{_WORD_NS}t":
+                    parts.append(element.text or "")
+                elif tag == f"{_WORD_NS}tab":
+                    parts.append("\t")
+                elif tag in (f"{_WORD_NS}br", f"{_WORD_NS}cr", f"{_WORD_NS}p"):
+                    parts.append("\n")
+                # Paragraph and table elements are done with once closed; keep memory flat
+                if tag in (f"{_WORD_NS}p", f"{_WORD_NS}tbl"):
+                    element.clear()
+    return "".join(parts)
+
+# RTF: single pass over control words, skipping destinations such as font and color tables. Of a
+# field (hyperlinks, page numbers) only the instruction is skipped; its \fldrslt result is text.
+_RTF_TOKEN = re.compile(r"\\([a-z]{1,32})(-?\d{1,10})? ?|\\'([0-9a-f]{2})|\\([^a-z])|([{}])|[\r\n]+|([^\\{}\r\n]+)", re.IGNORECASE)
+_RTF_SKIP_DESTINATIONS = {
+    "fonttbl", "colortbl", "stylesheet", "info", "pict", "header", "footer", "headerl", "headerr",
+    "footerl", "footerr", "listtable", "listoverridetable", "rsidtbl", "generator", "xmlnstbl",
+    "themedata", "colorschememapping", "datastore", "latentstyles", "object", "fldinst"
+}
+_RTF_CHARACTERS = {"par": "\n", "line": "\n", "sect": "\n", "page": "\n", "row": "\n", "tab": "\t", "cell": "\t", "emdash": "\u2014", "endash": "\u2013", "bullet": "\u2022", "lquote": "\u2018", "rquote": "\u2019", "ldblquote": "\u201c", "rdblquote": "\u201d"}
+
+def extract_rtf_text(data: bytes) -> str:
+    text = data.decode("latin-1")
+    parts = []
+    stack = []
+    skip = False
+    unicode_skip = 1
+    pending_skip = 0
+
+    for match in _RTF_TOKEN.finditer(text):
+        word, argument, hex_code, symbol, brace, plain = match.groups()
+
+        if brace == "{":
+            stack.append((skip, unicode_skip))
+            continue
+        if brace == "}":
+            if stack:
+                skip, unicode_skip = stack.pop()
+            continue
+        if match.group(0).startswith(("\r", "\n")):
+            continue
+
+        # Characters after \uN are the fallback representation of that code point
+        if pending_skip:
+            if plain:
+                consumed = min(pending_skip, len(plain))
+                plain = plain[consumed:]
+                pending_skip -= consumed
+                if not plain:
+                    continue
+            elif hex_code:
+                pending_skip -= 1
+                continue
+
+        if word:
+            word = word.lower()
+            if word in _RTF_SKIP_DESTINATIONS:
+                skip = True
+            elif word == "uc":
+                unicode_skip = int(argument or 1)
+            elif word == "u" and not skip:
+                code_point = int(argument or 0)
+                parts.append(chr(code_point + 65536 if code_point < 0 else code_point))
+                pending_skip = unicode_skip
+            elif not skip and word in _RTF_CHARACTERS:
+                parts.append(_RTF_CHARACTERS[word])
+        elif symbol:
+            if symbol == "*":
+                skip = True
+            elif not skip and symbol in "\\{}":
+                parts.append(symbol)
+            elif not skip and symbol == "~":
+                parts.append(" ")
+        elif hex_code and not skip:
+            parts.append(bytes([int(hex_code, 16)]).decode("cp1252", errors="replace"))
+        elif plain and not skip:
+            parts.append(plain)
+
+    return "".join(parts)
+
+# HTML: text content with line breaks at block elements, skipping scripts and styles
+_HTML_BLOCK_TAGS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "header", "footer", "table", "ul", "ol", "hr"}
+
+class _HTMLTextParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style", "head", "noscript"):
+            self.skip_depth += 1
+        elif tag in _HTML_BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style", "head", "noscript"):
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in _HTML_BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+def _decode_text(data: bytes) -> str:
+    if data.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return data.decode("utf-16")
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("cp1252", errors="replace")
+
+def extract_html_text(data: bytes) -> str:
+    parser = _HTMLTextParser()
+    parser.feed(_decode_text(data))
+    parser.close()
+    # Collapse the runs of blank lines left by nested block elements
+    return re.sub(r"\n\s*\n+", "\n\n", "".join(parser.parts)).strip() + "\n"
+
+def _is_html(data: bytes) -> bool:
+    head = _leading_text(data)
+    return head.startswith(("<!doctype html", "<html")) or ("<html" in head and "<body" in _leading_text(data, 4096))
+
+def _is_text(data: bytes) -> bool:
+    """
+    Non-blank data whose first 4 KB decode as UTF-8 (or BOM-marked UTF-16) and are mostly printable
+    """
+    raw = data[:4096]
+    if raw.startswith((b"\xff\xfe", b"\xfe\xff")):
+        sample = raw.decode("utf-16", errors="ignore")
+    else:
+        if b"\x00" in raw:
+            return False
+        try:
+            sample = raw.decode("utf-8")
+        except UnicodeDecodeError as e:
+            # A multi-byte character cut off by the sample boundary is still text
+            if e.start < len(raw) - 3:
+                return False
+            sample = raw[:e.start].decode("utf-8")
+
+    sample = sample.lstrip("\ufeff")
+    if not sample.strip():
+        return False
+    printable = sum(1 for char in sample if char.isprintable() or char in "\t\r\n\f")
+    return printable >= len(sample) * 0.95
+
+def extract_plain_text(data: bytes) -> str:
+    return _decode_text(data)
+
+register_extractor("pdf", "application/pdf", lambda data: data[:1024].lstrip().startswith(b"%PDF-") or b"%PDF-" in data[:1024], _extract_with_pymupdf("pdf"), "pdf")
+register_extractor("docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", _is_docx, extract_docx_text)
+register_extractor("rtf", "application/rtf", lambda data: data.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"{\\rtf"), extract_rtf_text)
+register_extractor("png", "image/png", lambda data: data.startswith(b"\x89PNG\r\n\x1a\n"), _extract_with_pymupdf("png"), "png")
+register_extractor("jpeg", "image/jpeg", lambda data: data.startswith(b"\xff\xd8\xff"), _extract_with_pymupdf("jpeg"), "jpeg")
+register_extractor("tiff", "image/tiff", lambda data: data.startswith((b"II*\x00", b"MM\x00*")), _extract_with_pymupdf("tiff"), "tiff")
+register_extractor("html", "text/html", _is_html, extract_html_text)
+register_extractor("txt", "text/plain", _is_text, extract_plain_text)
@@ -0,0 +1,143 @@
+import re
+from datetime import date
+import resume_sections
+
+# Deterministic experience calculation. Date ranges such as "Jan 2019 – Present", "2015-2018" and
+# "03/2020 - 11/2022" are parsed from the experience sections, overlapping positions are merged
+# for the total, and each position's duration is attributed to the skills mentioned in it.
+MONTHS = {"jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6, "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12}
+
+_MONTH_NAME = r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+_YEAR = r"(?:19[5-9]\d|20\d{2})"
+
+def _date_pattern(side: str) -> str:
+    return (
+        rf"(?:(?P<{side}_name>{_MONTH_NAME})\.?,?\s*(?P<{side}_name_year>{_YEAR})"
+        rf"|(?P<{side}_num>0?[1-9]|1[0-2])\s*[/.-]\s*(?P<{side}_num_year>{_YEAR})"
+        rf"|(?P<{side}_year>{_YEAR}))"
+    )
+
+DATE_RANGE_PATTERN = re.compile(
+    r"(?<![\w/])" + _date_pattern("start")
+    + r"\s*(?:-|–|—|to|until|through|till)\s*"
+    + r"(?:(?P<present>present|current|now|today|ongoing|date)|" + _date_pattern("end") + r")(?![\w/])",
+    re.IGNORECASE
+)
+
+# Sections whose dates are not employment
+NON_EMPLOYMENT_SECTIONS = {"education", "certifications", "publications", "awards", "volunteering", "references", "interests", "disclaimer"}
+
+def _month_index(match, side: str, is_end: bool):
+    if match.group(f"{side}_name"):
+        month = MONTHS[match.group(f"{side}_name").lower()[:3]]
+        year = int(match.group(f"{side}_name_year"))
+    elif match.group(f"{side}_num"):
+        month = int(match.group(f"{side}_num"))
+        year = int(match.group(f"{side}_num_year"))
+    else:
+        # A bare year covers the whole year: January for a start, December for an end
+        month = 12 if is_end else 1
+        year = int(match.group(f"{side}_year"))
+    return year * 12 + month - 1
+
+def _format_month(index: int) -> str:
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+def parse_date_ranges(text: str, today: date = None) -> list:
+    """
+    Date ranges in `text` as (start_index, end_index, is_current, match_start, match_end), where
+    indexes count months (year * 12 + month - 1) and both ends are inclusive
+    """
+    today = today or date.today()
+    now = today.year * 12 + today.month - 1
+    ranges = []
+
+    for match in DATE_RANGE_PATTERN.finditer(text):
+        start = _month_index(match, "start", False)
+        is_current = bool(match.group("present"))
+        end = now if is_current else _month_index(match, "end", True)
+        # Reversed or future ranges are typos or not employment
+        if start > end or start > now:
+            continue
+        ranges.append((start, min(end, now), is_current, match.start(), match.end()))
+    return ranges
+
+def merge_intervals(intervals: list) -> int:
+    """
+    Months covered by inclusive (start, end) month intervals, counting overlaps once
+    """
+    months = 0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end + 1:
+            if current_end is not None:
+                months += current_end - current_start + 1
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        months += current_end - current_start + 1
+    return months
+
+def _position_title(text: str, match_start: int, match_end: int) -> str:
+    """
+    Text on the range's line, or the nearest non-empty line above it when the line holds only dates
+    """
+    line_start = text.rfind("\n", 0, match_start) + 1
+    line_end = text.find("\n", match_end)
+    line_end = len(text) if line_end == -1 else line_end
+    title = (text[line_start:match_start] + " " + text[match_end:line_end]).strip(" \t|,-–—()")
+    if len(re.sub(r"\W", "", title)) >= 3:
+        return " ".join(title.split())
+
+    for line in reversed(text[:line_start].splitlines()):
+        if line.strip():
+            return " ".join(line.split())
+    return ""
+
+def compute_experience(text: str, headings=None, match_skills=None, today: date = None) -> dict:
+    """
+    Positions with their durations, total years with overlapping positions merged, and the
+    current position. When `match_skills(text)` is given, also the years each skill was used,
+    counting the positions whose text mentions it. Returns an empty dict when no dates are found.
+    """
+    sections = resume_sections.segment_text(text, headings)
+    if any(section == "experience" for section, _ in sections):
+        blocks = [section_text for section, section_text in sections if section == "experience"]
+    else:
+        blocks = [section_text for section, section_text in sections if section not in NON_EMPLOYMENT_SECTIONS]
+
+    positions = []
+    skill_intervals = {}
+    for block in blocks:
+        ranges = parse_date_ranges(block, today)
+        for number, (start, end, is_current, match_start, match_end) in enumerate(ranges):
+            positions.append({
+                "title": _position_title(block, match_start, match_end),
+                "start": _format_month(start),
+                "end": "present" if is_current else _format_month(end),
+                "months": end - start + 1,
+                "_interval": (start, end)
+            })
+            if match_skills:
+                # A position's text runs from its title line to the next position's dates
+                block_start = block.rfind("\n", 0, match_start) + 1
+                block_end = ranges[number + 1][3] if number + 1 < len(ranges) else len(block)
+                for skill in match_skills(block[block_start:block_end]):
+                    skill_intervals.setdefault(skill, []).append((start, end))
+
+    if not positions:
+        return {}
+
+    current = max(positions, key=lambda position: (position["end"] == "present", position["_interval"][1], position["_interval"][0]))
+    total_months = merge_intervals([position["_interval"] for position in positions])
+
+    for position in positions:
+        del position["_interval"]
+
+    return {
+        "total_years": round(total_months / 12, 1),
+        "current_position": current,
+        "positions": positions,
+        "skill_years": {skill: round(merge_intervals(intervals) / 12, 1) for skill, intervals in skill_intervals.items()}
+    }
@@ -1,142 +1,2108 @@
 import azure.functions as func
+import asyncio
 import base64
+import contextlib
+import hashlib
+import inspect
 import pymupdf
 import logging
 import json
+import math
+import multiprocessing
+import random
 import uuid
 import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
 from datetime import datetime
+from azure.core import MatchConditions
 from azure.cosmos import CosmosClient, PartitionKey
+from azure.cosmos.aio import CosmosClient as AsyncCosmosClient
 from azure.cosmos.exceptions import CosmosHttpResponseError
-from openai import AzureOpenAI
+from azure.storage.blob import BlobServiceClient
+import content_storage
+import document_extractors
+import experience_dates
+import contact_extraction
+import partitioning
+import pdf_workers
+import resume_sections
+import skill_matcher
+import tiktoken
+from openai import AzureOpenAI, AsyncAzureOpenAI, RateLimitError, APIConnectionError, InternalServerError
 import os
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 
+class ServiceBusyError(Exception):
+    """Raised when a backend is saturated and the request should be retried later"""
+
+# Process-level client pool. Clients are built lazily on first use and kept warm
+# across invocations so requests reuse keep-alive connections instead of paying
+# TLS handshakes and Cosmos account metadata fetches every time.
+_client_pool_lock = threading.Lock()
+_client_pool = {}
+_client_pool_stats = {}
+
+def _get_openai_settings() -> tuple:
+    azure_openai_endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
+    azure_openai_key = os.environ.get("AZURE_OPENAI_KEY")
+    azure_openai_api_version = os.environ.get("AZURE_OPENAI_API_VERSION", "2024-12-01-preview")
+
+    if not azure_openai_endpoint or not azure_openai_key:
+        raise ValueError("Azure OpenAI connection settings not found in environment variables")
+
+    return (azure_openai_endpoint, azure_openai_key, azure_openai_api_version)
+
+def _get_cosmos_settings() -> tuple:
+    cosmos_endpoint = os.environ.get("COSMOS_ENDPOINT")
+    cosmos_key = os.environ.get("COSMOS_KEY")
+    database_name = os.environ.get("COSMOS_DATABASE_NAME", "exploredb")
+    container_name = os.environ.get("COSMOS_CONTAINER_NAME", "resumes")
+
+    if not cosmos_endpoint or not cosmos_key:
+        raise ValueError("Cosmos DB connection settings not found in environment variables")
+
+    return (cosmos_endpoint, cosmos_key, database_name, container_name)
+
+def _get_pooled_client(name: str, config: tuple, factory):
+    """
+    Return the pooled handle for `name`, building it with `factory` when missing or when `config` changed.
+    `factory` returns a (client, handle) tuple; the client is what gets closed on rebuild.
+    """
+    with _client_pool_lock:
+        stats = _client_pool_stats.setdefault(name, {"created": 0, "reused": 0, "invalidated": 0, "last_created": None})
+        entry = _client_pool.get(name)
+        if entry and entry["config"] == config:
+            stats["reused"] += 1
+            return entry["handle"]
+
+        if entry:
+            logging.info(f"{name} settings changed, rebuilding pooled client")
+            _close_pooled_client(entry["client"])
+
+        client, handle = factory()
+        _client_pool[name] = {"config": config, "client": client, "handle": handle}
+        stats["created"] += 1
+        stats["last_created"] = datetime.utcnow().isoformat()
+
+        return handle
+
+def get_openai_client() -> AzureOpenAI:
+    """
+    Return the pooled Azure OpenAI client, rebuilding it when the connection settings change
+    """
+    endpoint, key, api_version = config = _get_openai_settings()
+
+    def factory():
+        # Retries are handled by the rate-limit scheduler, not the SDK
+        client = AzureOpenAI(azure_endpoint=endpoint, api_key=key, api_version=api_version, max_retries=0)
+        return client, client
+
+    return _get_pooled_client("openai", config, factory)
+
+def get_async_openai_client() -> AsyncAzureOpenAI:
+    """
+    Return the pooled async Azure OpenAI client, rebuilding it when the connection settings change
+    """
+    endpoint, key, api_version = config = _get_openai_settings()
+
+    def factory():
+        client = AsyncAzureOpenAI(azure_endpoint=endpoint, api_key=key, api_version=api_version, max_retries=0)
+        return client, client
+
+    return _get_pooled_client("openai_async", config, factory)
+
+def get_cosmos_container():
+    """
+    Return the pooled Cosmos DB container client, rebuilding it when the connection settings change
+    """
+    endpoint, key, database_name, container_name = config = _get_cosmos_settings()
+
+    def factory():
+        # Initialize Cosmos DB client and resolve database and container once
+        cosmos_client = CosmosClient(endpoint, key)
+        database = cosmos_client.get_database_client(database_name)
+        return cosmos_client, database.get_container_client(container_name)
+
+    return _get_pooled_client("cosmos", config, factory)
+
+def get_async_cosmos_container():
+    """
+    Return the pooled azure.cosmos.aio container client, rebuilding it when the connection settings change
+    """
+    endpoint, key, database_name, container_name = config = _get_cosmos_settings()
+
+    def factory():
+        cosmos_client = AsyncCosmosClient(endpoint, key)
+        database = cosmos_client.get_database_client(database_name)
+        return cosmos_client, database.get_container_client(container_name)
+
+    return _get_pooled_client("cosmos_async", config, factory)
+
+def get_storage_container(container_name: str):
+    """
+    Return a pooled blob container client on the AzureWebJobsStorage account, creating the container if needed
+    """
+    connection_string = os.environ.get("AzureWebJobsStorage")
+
+    if not connection_string:
+        raise ValueError("AzureWebJobsStorage connection setting not found in environment variables")
+
+    def factory():
+        blob_service = BlobServiceClient.from_connection_string(connection_string)
+        container = blob_service.get_container_client(container_name)
+        if not container.exists():
+            container.create_container()
+        return blob_service, container
+
+    return _get_pooled_client(f"blob:{container_name}", (connection_string, container_name), factory)
+
+def get_job_container():
+    """
+    Return the pooled blob container holding queued ingest job payloads and status records
+    """
+    return get_storage_container(os.environ.get("INGEST_JOB_CONTAINER_NAME", "resume-ingest-jobs"))
+
+def get_content_container():
+    """
+    Return the pooled blob container holding compressed resume texts (see content_storage)
+    """
+    return get_storage_container(os.environ.get("CONTENT_CONTAINER_NAME", "resume-content"))
+
+def store_original_content(document: dict, resume_text: str):
+    """
+    Attach the resume text to `document` as CONTENT_STORAGE_MODE says, uploading it first in blob
+    mode so a stored document never points at a missing blob
+    """
+    payload = content_storage.attach_content(document, resume_text, get_blob_container=get_content_container)
+    if payload is not None:
+        get_content_container().upload_blob(document["metadata"]["contentStorage"]["blob"], payload, overwrite=True)
+
+def load_original_content(document: dict) -> str:
+    """
+    Resume text of a stored document, fetched from side storage when it is not in the item
+    """
+    return content_storage.load_content(document, get_content_container)
+
+def invalidate_client(name: str):
+    """
+    Drop a pooled client (e.g. after an authentication failure) so the next call rebuilds it
+    """
+    with _client_pool_lock:
+        entry = _client_pool.pop(name, None)
+        if entry:
+            _client_pool_stats[name]["invalidated"] += 1
+            _close_pooled_client(entry["client"])
+            logging.warning(f"Invalidated pooled {name} client")
+
+def get_client_pool_stats() -> dict:
+    """
+    Snapshot of the process-level client pool
+    """
+    with _client_pool_lock:
+        return {
+            "pid": os.getpid(),
+            "clients": {
+                name: dict(stats, active=name in _client_pool)
+                for name, stats in _client_pool_stats.items()
+            }
+        }
+
+def _close_pooled_client(client):
+    try:
+        result = client.close() if hasattr(client, "close") else None
+        # Async clients return a coroutine from close(); schedule it on the running loop
+        if inspect.isawaitable(result):
+            try:
+                asyncio.get_running_loop().create_task(result)
+            except RuntimeError:
+                result.close()
+    except Exception as e:
+        logging.warning(f"Error closing pooled client: {str(e)}")
+
+def _is_auth_error(e: Exception) -> bool:
+    status_code = getattr(e, "status_code", None)
+    return status_code in (401, 403)
+
+# Content-hash dedup index. Maps the SHA-256 of the uploaded file bytes to the id of the
+# document already ingested from it, so re-uploads of the same PDF skip parsing and the LLM.
+# The in-process index is a bounded LRU; misses fall back to a single-partition query on
+# metadata.contentHash so duplicates are caught across workers too.
+_dedup_index_lock = threading.Lock()
+_dedup_index = OrderedDict()
+
+def is_dedup_enabled() -> bool:
+    return os.environ.get("RESUME_DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+
+def compute_content_hash(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def remember_content_hash(content_hash: str, document_id: str):
+    if not content_hash or not document_id:
+        return
+    max_entries = int(os.environ.get("RESUME_DEDUP_INDEX_MAX_ENTRIES", "10000"))
+    with _dedup_index_lock:
+        _dedup_index[content_hash] = document_id
+        _dedup_index.move_to_end(content_hash)
+        while len(_dedup_index) > max_entries:
+            _dedup_index.popitem(last=False)
+
+def _lookup_content_hash(content_hash: str):
+    with _dedup_index_lock:
+        document_id = _dedup_index.get(content_hash)
+        if document_id:
+            _dedup_index.move_to_end(content_hash)
+        return document_id
+
+def _forget_content_hash(content_hash: str):
+    with _dedup_index_lock:
+        _dedup_index.pop(content_hash, None)
+
+def _dedup_query(content_hash: str) -> dict:
+    return {
+        "query": "SELECT TOP 1 * FROM c WHERE c.metadata.contentHash = @hash",
+        "parameters": [{"name": "@hash", "value": content_hash}]
+    }
+
+# Deterministic document ids. The id is a UUIDv5 of a stable key, so a retried or repeated ingest
+# of the same resume addresses the same document instead of creating a copy. "content" keys on the
+# file's SHA-256, "identity" on the candidate's normalized email plus the FileUrl (a new version of
+# the same resume replaces the old one) and "uuid" keeps the old random ids.
+RESUME_ID_NAMESPACE = uuid.UUID("6f1c2a8e-3b7d-5e90-a4c1-8d2f6b0e9a37")
+
+def get_resume_id_scheme() -> str:
+    return os.environ.get("RESUME_ID_SCHEME", "content").lower()
+
+def content_document_id(content_hash: str) -> str:
+    return str(uuid.uuid5(RESUME_ID_NAMESPACE, f"content:{content_hash}"))
+
+def resume_document_id(content_hash: str, file_url: str = "", email: str = "") -> str:
+    """
+    Document id for the configured RESUME_ID_SCHEME, falling back to the content hash when the
+    identity fields are missing and to a random id when there is no hash either
+    """
+    scheme = get_resume_id_scheme()
+    if scheme == "identity" and email and file_url:
+        key = f"identity:{email.strip().lower()}\n{file_url.strip().split('?')[0].lower()}"
+        return str(uuid.uuid5(RESUME_ID_NAMESPACE, key))
+    if scheme != "uuid" and content_hash:
+        return content_document_id(content_hash)
+    return str(uuid.uuid4())
+
+def split_tags(tags: str) -> list:
+    """
+    Split a tags string on common delimiters
+    """
+    if not tags:
+        return []
+    tag_list = tags.replace(",", " ").replace(";", " ").replace("|", " ").split()
+    return [tag.strip() for tag in tag_list if tag.strip()]
+
+def merge_tags(existing_tags: str, new_tags: str) -> str:
+    """
+    Union of two tags strings, keeping the order of first appearance
+    """
+    merged = []
+    seen = set()
+    for tag in split_tags(existing_tags) + split_tags(new_tags):
+        if tag.lower() not in seen:
+            seen.add(tag.lower())
+            merged.append(tag)
+    return ",".join(merged)
+
+def _apply_tag_merge(document: dict, tags: str) -> bool:
+    """
+    Merge `tags` into an existing document in place. Returns True when the document changed.
+    """
+    merged = merge_tags(document.get("tags", ""), tags)
+    if set(split_tags(merged)) == set(split_tags(document.get("tags", ""))):
+        return False
+
+    document["tags"] = merged
+    searchable = set(document.get("searchable_text", "").split())
+    searchable.update(tag.lower() for tag in split_tags(tags))
+    document["searchable_text"] = " ".join(searchable)
+    return True
+
+def read_resume_document(container, document_id: str):
+    """
+    Point read a resume by id under the configured partition scheme (see partitioning); None when missing
+    """
+    for partition_key in partitioning.read_partition_keys(document_id):
+        try:
+            return container.read_item(item=document_id, partition_key=partition_key)
+        except CosmosHttpResponseError as e:
+            if e.status_code != 404:
+                raise
+    return None
+
+async def read_resume_document_async(container, document_id: str):
+    for partition_key in partitioning.read_partition_keys(document_id):
+        try:
+            return await container.read_item(item=document_id, partition_key=partition_key)
+        except CosmosHttpResponseError as e:
+            if e.status_code != 404:
+                raise
+    return None
+
+def merge_duplicate_tags(container, document: dict, tags: str):
+    """
+    Merge `tags` into a stored duplicate with an ETag-conditional replace, re-reading and merging
+    again when another writer changed it in between. None when the document was deleted meanwhile.
+    """
+    for _ in range(_get_write_attempts()):
+        if not _apply_tag_merge(document, tags):
+            return document
+        try:
+            return container.replace_item(item=document["id"], body=document, etag=document["_etag"], match_condition=MatchConditions.IfNotModified)
+        except CosmosHttpResponseError as e:
+            if e.status_code != 412:
+                raise
+            logging.info(f"Document {document['id']} changed concurrently, retrying tag merge")
+        try:
+            document = container.read_item(item=document["id"], partition_key=partitioning.document_partition_key(document))
+        except CosmosHttpResponseError as e:
+            if e.status_code == 404:
+                return None
+            raise
+
+    raise Exception(f"Conflicting concurrent writes to document {document['id']}")
+
+async def merge_duplicate_tags_async(container, document: dict, tags: str):
+    """
+    Async variant of merge_duplicate_tags
+    """
+    for _ in range(_get_write_attempts()):
+        if not _apply_tag_merge(document, tags):
+            return document
+        try:
+            return await container.replace_item(item=document["id"], body=document, etag=document["_etag"], match_condition=MatchConditions.IfNotModified)
+        except CosmosHttpResponseError as e:
+            if e.status_code != 412:
+                raise
+            logging.info(f"Document {document['id']} changed concurrently, retrying tag merge")
+        try:
+            document = await container.read_item(item=document["id"], partition_key=partitioning.document_partition_key(document))
+        except CosmosHttpResponseError as e:
+            if e.status_code == 404:
+                return None
+            raise
+
+    raise Exception(f"Conflicting concurrent writes to document {document['id']}")
+
+def find_duplicate_resume(content_hash: str, tags: str = "", merge: bool = False):
+    """
+    Return the document previously ingested from the same file bytes, or None.
+    When `merge` is set, new tags are merged into the existing document.
+    """
+    try:
+        container = get_cosmos_container()
+        document = None
+
+        # Remembered id first, then the id the content scheme would have given the document
+        for document_id in dict.fromkeys(filter(None, [_lookup_content_hash(content_hash), content_document_id(content_hash)])):
+            document = read_resume_document(container, document_id)
+            if document is None:
+                _forget_content_hash(content_hash)
+                continue
+            # Under the identity scheme the id may now hold a different version of the resume
+            if document.get("metadata", {}).get("contentHash") == content_hash:
+                break
+            document = None
+
+        if document is None:
+            results = list(container.query_items(**_dedup_query(content_hash), **partitioning.query_partition_args()))
+            document = results[0] if results else None
+
+        if document is None:
+            return None
+
+        remember_content_hash(content_hash, document["id"])
+
+        if merge and tags:
+            document = merge_duplicate_tags(container, document, tags)
+
+        return document
+
+    except CosmosHttpResponseError as e:
+        # Dedup is an optimization; fall through to a normal ingest on lookup failures
+        logging.warning(f"Dedup lookup failed: {str(e)}")
+        return None
+
+async def find_duplicate_resume_async(content_hash: str, tags: str = "", merge: bool = False):
+    """
+    Async variant of find_duplicate_resume using the azure.cosmos.aio container client
+    """
+    try:
+        container = get_async_cosmos_container()
+        document = None
+
+        # Remembered id first, then the id the content scheme would have given the document
+        for document_id in dict.fromkeys(filter(None, [_lookup_content_hash(content_hash), content_document_id(content_hash)])):
+            document = await read_resume_document_async(container, document_id)
+            if document is None:
+                _forget_content_hash(content_hash)
+                continue
+            # Under the identity scheme the id may now hold a different version of the resume
+            if document.get("metadata", {}).get("contentHash") == content_hash:
+                break
+            document = None
+
+        if document is None:
+            results = [item async for item in container.query_items(**_dedup_query(content_hash), **partitioning.query_partition_args(is_async=True))]
+            document = results[0] if results else None
+
+        if document is None:
+            return None
+
+        remember_content_hash(content_hash, document["id"])
+
+        if merge and tags:
+            document = await merge_duplicate_tags_async(container, document, tags)
+
+        return document
+
+    except CosmosHttpResponseError as e:
+        logging.warning(f"Dedup lookup failed: {str(e)}")
+        return None
+
+@app.route(route="stats", methods=["GET"])
+def stats(req: func.HttpRequest) -> func.HttpResponse:
+    return json_response({
+        "status": "success",
+        "client_pool": get_client_pool_stats(),
+        "openai_rate_limiter": get_openai_rate_stats(),
+        "extraction_cache": get_extraction_cache_stats(),
+        "llm_usage": get_llm_usage_stats(),
+        "cpu_pool": get_cpu_pool_stats(),
+        "dedup_index": {"entries": len(_dedup_index)}
+    })
+
+def json_response(body: dict, status_code: int = 200) -> func.HttpResponse:
+    return func.HttpResponse(
+        json.dumps(body),
+        mimetype="application/json",
+        status_code=status_code
+    )
+
+def error_response(message: str, status_code: int = 400) -> func.HttpResponse:
+    return json_response({
+        "status": "error",
+        "message": message
+    }, status_code)
+
+def parse_ingest_request(req: func.HttpRequest):
+    """
+    Parse and validate an ingest request body. Returns (file_url, file_content, tags, merge_tags) or an error response.
+    """
+    # Get the request body and parse JSON
+    req_body = req.get_json()
+
+    if not req_body:
+        return error_response("Invalid JSON in request body")
+
+    # Extract FileUrl and FileContent from request
+    file_url = req_body.get("FileUrl", "")
+    file_content = req_body.get("FileContent", "")
+    tags = req_body.get("Tags", "")  # Tags as string
+    merge = bool(req_body.get("MergeTags", False))  # Merge Tags into an existing duplicate
+
+    if not file_content:
+        return error_response("FileContent is required")
+
+    return file_url, file_content, tags, merge
+
+def is_json_body(req: func.HttpRequest) -> bool:
+    """
+    Whether a request carries a JSON ingest body. Sniffed as well as read from the Content-Type,
+    since clients like curl -d send JSON as application/x-www-form-urlencoded; RTF documents also
+    start with "{" but never with a JSON object.
+    """
+    if req.headers.get("Content-Type", "").lower().startswith("application/json"):
+        return True
+    start = req.get_body()[:64].lstrip(b"\xef\xbb\xbf \t\r\n")
+    return start.startswith(b"{") and not start.startswith(b"{\\rtf")
+
+def decode_file_content(file_content: str) -> bytes:
+    """
+    Strictly decode a base64 FileContent. Raises ValueError for invalid or empty content instead of
+    silently dropping the invalid characters.
+    """
+    file_bytes = base64.b64decode("".join(file_content.split()), validate=True)
+    if not file_bytes:
+        raise ValueError("FileContent is empty")
+    return file_bytes
+
+def open_pdf(pdf_bytes: bytes):
+    return pymupdf.Document(stream=pdf_bytes, filetype="pdf") # Open the PDF file
+
+def iter_pdf_page_text(doc):
+    """
+    Yield the plain text of each page on demand, with a newline separator per page.
+    Scanned pages are OCR'd (see pdf_workers.page_text).
+    """
+    for page in doc:
+        yield pdf_workers.page_text(page)
+
+def read_prompt_head(pages) -> list:
+    """
+    Consume page texts from `pages` until they fill the prompt window
+    """
+    head = []
+    length = 0
+    for text in pages:
+        head.append(text)
+        length += len(text)
+        if length >= prompt_window_chars():
+            break
+    return head
+
+# Persistent CPU worker pool. PDF extraction runs in spawned worker processes (not forked, the
+# Functions worker is multi-threaded) so it does not contend for the GIL with I/O-bound requests.
+# The PDF is handed to workers through shared memory rather than pickled through the pool's pipe.
+# Submissions go through admission control: when too many tasks are queued, callers wait briefly
+# and are then rejected with a 503. A worker that dies (a MuPDF crash, an OOM kill) breaks the
+# whole executor, so a broken pool is replaced and its tasks are retried once.
+class CpuPoolSaturatedError(ServiceBusyError):
+    """Raised when the CPU worker pool has no room for another task"""
+
+class CpuPoolBrokenError(ServiceBusyError):
+    """Raised when a task keeps losing its worker process"""
+
+_cpu_pool_lock = threading.Lock()
+_cpu_pool = None
+_cpu_pool_admission = None
+_cpu_pool_stats = {"processes": 0, "max_queue": 0, "submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "in_flight": 0, "peak_in_flight": 0, "restarts": 0}
+
+def is_cpu_pool_enabled() -> bool:
+    return os.environ.get("CPU_POOL_ENABLED", "false").lower() in ("1", "true", "yes")
+
+def _get_cpu_pool_entry() -> tuple:
+    """
+    The current pool and its admission semaphore, starting them if needed
+    """
+    global _cpu_pool, _cpu_pool_admission
+    with _cpu_pool_lock:
+        if _cpu_pool is None:
+            processes = int(os.environ.get("CPU_POOL_PROCESSES", str(os.cpu_count() or 1)))
+            max_queue = int(os.environ.get("CPU_POOL_MAX_QUEUE", str(processes * 4)))
+
+            _cpu_pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+            _cpu_pool_admission = threading.BoundedSemaphore(max_queue)
+            _cpu_pool_stats["processes"] = processes
+            _cpu_pool_stats["max_queue"] = max_queue
+
+            # Start every worker now rather than on the first real tasks
+            for _ in range(processes):
+                _cpu_pool.submit(pdf_workers.warmup)
+        return _cpu_pool, _cpu_pool_admission
+
+def get_cpu_pool() -> ProcessPoolExecutor:
+    return _get_cpu_pool_entry()[0]
+
+def discard_cpu_pool(pool: ProcessPoolExecutor):
+    """
+    Drop a broken pool so the next submission starts a new one with a fresh admission semaphore.
+    Tasks of the broken pool fail with BrokenProcessPool, and their done callbacks settle the
+    in-flight count and the old semaphore.
+    """
+    global _cpu_pool, _cpu_pool_admission
+    with _cpu_pool_lock:
+        if _cpu_pool is not pool:
+            return  # another thread already replaced it
+        _cpu_pool = None
+        _cpu_pool_admission = None
+        _cpu_pool_stats["restarts"] += 1
+    logging.warning("A CPU worker process died; replacing the worker pool")
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _cpu_task_done(admission, future):
+    admission.release()
+    with _cpu_pool_lock:
+        _cpu_pool_stats["in_flight"] -= 1
+        _cpu_pool_stats["failed" if future.cancelled() or future.exception() else "completed"] += 1
+
+def submit_cpu_task(fn, *args):
+    """
+    Submit `fn(*args)` to the CPU worker pool, waiting up to CPU_POOL_ADMISSION_TIMEOUT_SECONDS for room
+    """
+    pool, admission = _get_cpu_pool_entry()
+    timeout = float(os.environ.get("CPU_POOL_ADMISSION_TIMEOUT_SECONDS", "10"))
+
+    if not admission.acquire(timeout=timeout):
+        with _cpu_pool_lock:
+            _cpu_pool_stats["rejected"] += 1
+        raise CpuPoolSaturatedError("CPU worker pool is saturated")
+
+    with _cpu_pool_lock:
+        _cpu_pool_stats["submitted"] += 1
+        _cpu_pool_stats["in_flight"] += 1
+        _cpu_pool_stats["peak_in_flight"] = max(_cpu_pool_stats["peak_in_flight"], _cpu_pool_stats["in_flight"])
+
+    try:
+        future = pool.submit(fn, *args)
+    except BaseException as e:
+        admission.release()
+        with _cpu_pool_lock:
+            _cpu_pool_stats["in_flight"] -= 1
+        if isinstance(e, BrokenProcessPool):
+            discard_cpu_pool(pool)
+        raise
+    future.cpu_pool = pool
+    future.add_done_callback(lambda done: _cpu_task_done(admission, done))
+    return future
+
+def run_cpu_tasks(calls: list) -> list:
+    """
+    Run [(fn, args), ...] in the CPU worker pool and return the results in order. When a worker
+    dies the broken pool is replaced and the tasks are retried once; if that fails too (typically
+    a document that crashes MuPDF), the request fails with a 503 rather than the pool staying broken.
+    """
+    for attempt in range(2):
+        futures = []
+        try:
+            futures = [submit_cpu_task(fn, *args) for fn, args in calls]
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            for future in futures:
+                discard_cpu_pool(future.cpu_pool)
+            if attempt:
+                raise CpuPoolBrokenError("CPU worker process died while extracting the document")
+
+def get_cpu_pool_stats() -> dict:
+    with _cpu_pool_lock:
+        return dict(_cpu_pool_stats, enabled=is_cpu_pool_enabled(), started=_cpu_pool is not None)
+
+# Optionally start the pool with the Functions worker instead of on the first request
+if is_cpu_pool_enabled() and os.environ.get("CPU_POOL_PRESTART", "false").lower() in ("1", "true", "yes"):
+    get_cpu_pool()
+
+def share_pdf(pdf_bytes: bytes) -> SharedMemory:
+    """
+    Copy the PDF into a shared memory block workers can open without it being pickled to them
+    """
+    shm = SharedMemory(create=True, size=max(len(pdf_bytes), 1))
+    shm.buf[:len(pdf_bytes)] = pdf_bytes
+    return shm
+
+def release_shared_pdf(shm: SharedMemory):
+    shm.close()
+    shm.unlink()
+
+def use_parallel_extraction(page_count: int) -> bool:
+    threshold = int(os.environ.get("PARALLEL_EXTRACTION_PAGE_THRESHOLD", "50"))
+    return threshold > 0 and page_count >= threshold
+
+def extract_shared_page_range(shm: SharedMemory, size: int, start: int, stop: int, page_count: int) -> str:
+    """
+    Extract pages [start, stop) of a shared PDF in the worker pool. Large documents are sharded across
+    workers; shards are joined in page order.
+    """
+    shard_count = _cpu_pool_stats["processes"] if use_parallel_extraction(page_count) else 1
+    shard_size = math.ceil((stop - start) / max(1, min(shard_count, stop - start)))
+
+    return "".join(run_cpu_tasks([
+        (pdf_workers.extract_page_range, (shm.name, size, shard_start, min(shard_start + shard_size, stop)))
+        for shard_start in range(start, stop, shard_size)
+    ]))
+
+def start_pdf_extraction(pdf_bytes: bytes) -> tuple:
+    """
+    Extract the pages that fill the prompt window. Returns (head_text, layout, finish), where layout
+    holds the headings and link targets of those pages (see pdf_workers.page_layout) and finish()
+    extracts and returns the remaining text and releases the document. finish is None when the
+    head is the whole document.
+    """
+    size = len(pdf_bytes)
+
+    if is_cpu_pool_enabled():
+        get_cpu_pool()
+        shm = share_pdf(pdf_bytes)
+        try:
+            head, page_count, layout = run_cpu_tasks([(pdf_workers.extract_prompt_head, (shm.name, size, prompt_window_chars(), True))])[0]
+        except BaseException:
+            release_shared_pdf(shm)
+            raise
+
+        if len(head) == page_count:
+            release_shared_pdf(shm)
+            return "".join(head), layout, None
+
+        def finish_pooled() -> str:
+            try:
+                return extract_shared_page_range(shm, size, len(head), page_count, page_count)
+            finally:
+                release_shared_pdf(shm)
+
+        return "".join(head), layout, finish_pooled
+
+    doc = open_pdf(pdf_bytes)
+    try:
+        pages = iter_pdf_page_text(doc)
+        head = read_prompt_head(pages)
+        layout = pdf_workers.page_layout(doc[page_number] for page_number in range(len(head)))
+    except BaseException:
+        doc.close()
+        raise
+
+    page_count = doc.page_count
+    if len(head) == page_count:
+        doc.close()
+        return "".join(head), layout, None
+
+    def finish_inline() -> str:
+        try:
+            # Large documents are sharded across the worker pool even when the pool is not used for everything
+            if use_parallel_extraction(page_count):
+                get_cpu_pool()
+                shm = share_pdf(pdf_bytes)
+                try:
+                    return extract_shared_page_range(shm, size, len(head), page_count, page_count)
+                finally:
+                    release_shared_pdf(shm)
+            return "".join(pages)
+        finally:
+            doc.close()
+
+    return "".join(head), layout, finish_inline
+
+def start_document_extraction(file_bytes: bytes, document_type: dict) -> tuple:
+    """
+    Same contract as start_pdf_extraction for any registered document type
+    """
+    if document_type["kind"] == "pdf":
+        return start_pdf_extraction(file_bytes)
+    # Other formats are extracted in one go; there are no pages to overlap with the AI call. Their
+    # sections and contacts are found from the text alone.
+    return document_extractors.extract_document_text(file_bytes, document_type), None, None
+
+# Threads that run AI extraction while the request thread extracts the remaining pages
+_ai_dispatch_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("AI_DISPATCH_THREADS", "16")),
+    thread_name_prefix="ai-dispatch"
+)
+
+def extract_document_and_ai_data(file_bytes: bytes, document_type: dict, compact: bool = None) -> tuple:
+    """
+    Extract the document text and the AI data, dispatching the AI call as soon as the prompt window is
+    filled and extracting the remaining pages while it runs. Returns (extracted_text, ai_extracted_data).
+    """
+    extracted_text, layout, finish = start_document_extraction(file_bytes, document_type)
+
+    # Short resumes have nothing left to overlap with the AI call
+    if finish is None:
+        return extracted_text, extract_resume_data_with_ai(extracted_text, layout, compact)
+
+    try:
+        ai_future = _ai_dispatch_executor.submit(extract_resume_data_with_ai, extracted_text, layout, compact)
+    finally:
+        extracted_text += finish()
+
+    return extracted_text, ai_future.result()
+
+async def extract_document_and_ai_data_async(file_bytes: bytes, document_type: dict, limits: dict = None, compact: bool = None) -> tuple:
+    """
+    Async variant of extract_document_and_ai_data. Page extraction runs in a thread and the AI call is
+    awaited concurrently on the event loop.
+    """
+    limits = limits or {}
+
+    async def extract_ai_data(text: str, layout: dict) -> dict:
+        async with limits.get("ai") or contextlib.nullcontext():
+            return await extract_resume_data_with_ai_async(text, layout, compact)
+
+    async with limits.get("extract") or contextlib.nullcontext():
+        extracted_text, layout, finish = await asyncio.to_thread(start_document_extraction, file_bytes, document_type)
+
+        # Short resumes have nothing left to overlap with the AI call
+        if finish is None:
+            ai_task = None
+        else:
+            ai_task = asyncio.create_task(extract_ai_data(extracted_text, layout))
+            try:
+                extracted_text += await asyncio.to_thread(finish)
+            except BaseException:
+                ai_task.cancel()
+                raise
+
+    if ai_task is None:
+        return extracted_text, await extract_ai_data(extracted_text, layout)
+    return extracted_text, await ai_task
+
+def build_ingest_result(file_url: str, tags: str, extracted_text_length: int, cosmos_result: dict, duplicate: bool = False) -> dict:
+    if duplicate:
+        message = "Resume already ingested, returning existing Cosmos DB document"
+    else:
+        message = "Resume processed and uploaded to Cosmos DB successfully"
+
+    return {
+        "status": "success",
+        "file_url": file_url,
+        "tags": cosmos_result.get("tags", tags) if duplicate else tags,
+        "duplicate": duplicate,
+        "extracted_text_length": extracted_text_length,
+        "cosmos_document_id": cosmos_result.get("id"),
+        "candidate_info": {
+            "name": cosmos_result.get("personalInfo", {}).get("name", ""),
+            "email": cosmos_result.get("personalInfo", {}).get("email", ""),
+            "location": cosmos_result.get("personalInfo", {}).get("location", ""),
+            "total_experience_years": cosmos_result.get("experience", {}).get("total_years", 0),
+            "current_role": cosmos_result.get("experience", {}).get("current_role", ""),
+            "technical_skills_count": len(cosmos_result.get("skills", {}).get("technical_skills", [])),
+            "soft_skills_count": len(cosmos_result.get("skills", {}).get("soft_skills", [])),
+            "certifications_count": len(cosmos_result.get("certifications", [])),
+            "industries": cosmos_result.get("experience", {}).get("industries", [])
+        },
+        "message": message
+    }
+
+def parse_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in ("1", "true", "yes")
+
+def parse_binary_ingest_request(req: func.HttpRequest):
+    """
+    Parse a raw document body or multipart/form-data ingest request.
+    Returns (file_url, file_bytes, tags, merge_tags) or an error response.
+    """
+    content_type = req.headers.get("Content-Type", "").lower()
+
+    if content_type.startswith("multipart/form-data"):
+        # File part plus FileUrl/Tags/MergeTags form fields; headers are used as a fallback
+        upload = req.files.get("File") or req.files.get("file") or next(iter(req.files.values()), None)
+        file_bytes = upload.read() if upload else b""
+        file_url = req.form.get("FileUrl") or req.headers.get("X-File-Url", "")
+        tags = req.form.get("Tags") or req.headers.get("X-Tags", "")
+        merge = parse_bool(req.form.get("MergeTags") or req.headers.get("X-Merge-Tags"))
+    elif is_json_body(req):
+        # A JSON ingest body sent here would otherwise be ingested as a text document
+        return error_response("JSON ingest bodies must be sent to /api/ingestresume")
+    else:
+        # Raw body with FileUrl/Tags/MergeTags passed as headers
+        file_bytes = req.get_body()
+        file_url = req.headers.get("X-File-Url", "")
+        tags = req.headers.get("X-Tags", "")
+        merge = parse_bool(req.headers.get("X-Merge-Tags"))
+
+    if not file_bytes:
+        return error_response("File content is required")
+
+    return file_url, file_bytes, tags, merge
+
+def ingest_document_bytes(file_url: str, file_bytes: bytes, tags: str, merge: bool = False, compact: bool = None) -> dict:
+    """
+    Run the ingest pipeline (dedup, text extraction, AI extraction, Cosmos upload) on a raw document
+    of any registered type. `compact` selects the AI output format (see parse_compact_output).
+    """
+    if not file_bytes:
+        raise ValueError("Document is empty")
+    document_type = document_extractors.detect_document_type(file_bytes)
+
+    # Short-circuit re-uploads of a file that was already ingested
+    content_hash = compute_content_hash(file_bytes)
+    if is_dedup_enabled():
+        existing = find_duplicate_resume(content_hash, tags, merge)
+        if existing:
+            logging.info(f"Duplicate upload of document {existing['id']}, skipping ingestion")
+            return build_ingest_result(file_url, tags, existing.get("metadata", {}).get("contentLength", 0), existing, duplicate=True)
+
+    extracted_text, ai_extracted_data = extract_document_and_ai_data(file_bytes, document_type, compact)
+
+    # Upload to Cosmos DB for vectorization
+    cosmos_result = upload_to_cosmos_db(file_url, extracted_text, tags, content_hash, ai_extracted_data, document_type)
+
+    return build_ingest_result(file_url, tags, len(extracted_text), cosmos_result)
+
+async def ingest_document_bytes_async(file_url: str, file_bytes: bytes, tags: str, merge: bool = False, limits: dict = None, compact: bool = None) -> dict:
+    """
+    Async variant of ingest_document_bytes. `limits` optionally holds "extract", "ai" and "cosmos"
+    semaphores bounding each stage.
+    """
+    if not file_bytes:
+        raise ValueError("Document is empty")
+    limits = limits or {}
+    document_type = document_extractors.detect_document_type(file_bytes)
+
+    # Short-circuit re-uploads of a file that was already ingested
+    content_hash = compute_content_hash(file_bytes)
+    if is_dedup_enabled():
+        async with limits.get("cosmos") or contextlib.nullcontext():
+            existing = await find_duplicate_resume_async(content_hash, tags, merge)
+        if existing:
+            logging.info(f"Duplicate upload of document {existing['id']}, skipping ingestion")
+            return build_ingest_result(file_url, tags, existing.get("metadata", {}).get("contentLength", 0), existing, duplicate=True)
+
+    # Extract text off the event loop, overlapping the AI call with the remaining pages
+    extracted_text, ai_extracted_data = await extract_document_and_ai_data_async(file_bytes, document_type, limits, compact)
+
+    # Upload to Cosmos DB for vectorization
+    cosmos_result = await upload_to_cosmos_db_async(file_url, extracted_text, tags, content_hash, limits, ai_extracted_data, document_type)
+
+    return build_ingest_result(file_url, tags, len(extracted_text), cosmos_result)
+
 @app.route(route="ingestresume",methods=["POST"])
 def ingestresume(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Python HTTP trigger function processed a request.')
 
     try:
-        # Get the request body and parse JSON
-        req_body = req.get_json()
-        
-        if not req_body:
-            return func.HttpResponse(
-                json.dumps({
-                    "status": "error",
-                    "message": "Invalid JSON in request body"
-                }),
-                mimetype="application/json",
-                status_code=400
-            )
-        
-        # Extract FileUrl and FileContent from request
-        file_url = req_body.get("FileUrl", "")
-        file_content = req_body.get("FileContent", "")
-        tags = req_body.get("Tags", "")  # Tags as string
-        
-        if not file_content:
-            return func.HttpResponse(
-                json.dumps({
-                    "status": "error",
-                    "message": "FileContent is required"
-                }),
-                mimetype="application/json",
-                status_code=400
-            )
-        
-        # Decode base64 PDF
-        pdf_bytes = base64.b64decode(file_content)
-        
-        doc = pymupdf.Document(stream=pdf_bytes, filetype="pdf") # Open the PDF file
-
-        # Initialize text variable to store all extracted text
-        extracted_text = ""
-        
-        # Iterate through pages and extract text
-        for page in doc:
-            text = page.get_text()  # get plain text
-            extracted_text += text + "\n"  # add page text with newline separator
-        
-        # Close the document
-        doc.close()
-        
-        # Upload to Cosmos DB for vectorization
-        cosmos_result = upload_to_cosmos_db(file_url, extracted_text, tags)
-        
-        return func.HttpResponse(
-            json.dumps({
-                "status": "success",
-                "file_url": file_url,
-                "tags": tags,
-                "extracted_text_length": len(extracted_text),
-                "cosmos_document_id": cosmos_result.get("id"),
-                "candidate_info": {
-                    "name": cosmos_result.get("personalInfo", {}).get("name", ""),
-                    "email": cosmos_result.get("personalInfo", {}).get("email", ""),
-                    "location": cosmos_result.get("personalInfo", {}).get("location", ""),
-                    "total_experience_years": cosmos_result.get("experience", {}).get("total_years", 0),
-                    "current_role": cosmos_result.get("experience", {}).get("current_role", ""),
-                    "technical_skills_count": len(cosmos_result.get("skills", {}).get("technical_skills", [])),
-                    "soft_skills_count": len(cosmos_result.get("skills", {}).get("soft_skills", [])),
-                    "certifications_count": len(cosmos_result.get("certifications", [])),
-                    "industries": cosmos_result.get("experience", {}).get("industries", [])
+        parsed = parse_ingest_request(req)
+        if isinstance(parsed, func.HttpResponse):
+            return parsed
+        file_url, file_content, tags, merge = parsed
+
+        # Decode base64 document
+        file_bytes = decode_file_content(file_content)
+        # Release the base64 string before parsing the document
+        del file_content, parsed
+
+        return json_response(ingest_document_bytes(file_url, file_bytes, tags, merge, parse_compact_output(req)))
+
+    except json.JSONDecodeError:
+        return error_response("Invalid JSON format in request body")
+    except ServiceBusyError as e:
+        logging.error(f"Service busy: {str(e)}")
+        return error_response(f"Service is busy, retry later: {str(e)}", 503)
+    except Exception as e:
+        logging.error(f"Error processing PDF: {str(e)}")
+        return error_response(f"Error processing PDF: {str(e)}")
+
+@app.route(route="ingestresumebinary",methods=["POST"])
+def ingestresume_binary(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Ingest a resume sent as a raw document body (PDF, DOCX, RTF, HTML, TXT or image) or a
+    multipart/form-data upload, avoiding the base64 encoding overhead of ingestresume
+    """
+    logging.info('Python binary HTTP trigger function processed a request.')
+
+    try:
+        parsed = parse_binary_ingest_request(req)
+        if isinstance(parsed, func.HttpResponse):
+            return parsed
+        file_url, file_bytes, tags, merge = parsed
+
+        return json_response(ingest_document_bytes(file_url, file_bytes, tags, merge, parse_compact_output(req)))
+
+    except ServiceBusyError as e:
+        logging.error(f"Service busy: {str(e)}")
+        return error_response(f"Service is busy, retry later: {str(e)}", 503)
+    except Exception as e:
+        logging.error(f"Error processing PDF: {str(e)}")
+        return error_response(f"Error processing PDF: {str(e)}")
+
+@app.route(route="ingestresumeasync",methods=["POST"])
+async def ingestresume_async(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Async variant of ingestresume. The LLM and Cosmos round trips are awaited on the event loop and
+    PDF extraction runs in a thread, so one worker can hold many in-flight ingests.
+    """
+    logging.info('Python async HTTP trigger function processed a request.')
+
+    try:
+        parsed = parse_ingest_request(req)
+        if isinstance(parsed, func.HttpResponse):
+            return parsed
+        file_url, file_content, tags, merge = parsed
+
+        # Decode base64 PDF off the event loop
+        file_bytes = await asyncio.to_thread(decode_file_content, file_content)
+        del file_content, parsed
+
+        return json_response(await ingest_document_bytes_async(file_url, file_bytes, tags, merge, compact=parse_compact_output(req)))
+
+    except json.JSONDecodeError:
+        return error_response("Invalid JSON format in request body")
+    except ServiceBusyError as e:
+        logging.error(f"Service busy: {str(e)}")
+        return error_response(f"Service is busy, retry later: {str(e)}", 503)
+    except Exception as e:
+        logging.error(f"Error processing PDF: {str(e)}")
+        return error_response(f"Error processing PDF: {str(e)}")
+
+# Queue-backed ingestion. The HTTP trigger stores the file in blob storage, enqueues a job
+# and returns 202; the queue trigger runs the normal pipeline and records progress in a
+# status blob next to the payload.
+INGEST_JOB_QUEUE_NAME = "resume-ingest-jobs"
+INGEST_JOB_MAX_ATTEMPTS = 5  # matches the host's default queues.maxDequeueCount
+
+def write_job_status(job_id: str, status: str, **fields) -> dict:
+    container = get_job_container()
+    blob = container.get_blob_client(f"{job_id}/status.json")
+
+    record = {"job_id": job_id, "status": status, "updated": datetime.utcnow().isoformat()}
+    if blob.exists():
+        record = dict(json.loads(blob.download_blob().readall()), **record)
+    record.update(fields)
+
+    blob.upload_blob(json.dumps(record), overwrite=True)
+    return record
+
+def read_job_status(job_id: str):
+    blob = get_job_container().get_blob_client(f"{job_id}/status.json")
+    if not blob.exists():
+        return None
+    return json.loads(blob.download_blob().readall())
+
+@app.route(route="ingestresumejob",methods=["POST"])
+@app.queue_output(arg_name="job_queue", queue_name=INGEST_JOB_QUEUE_NAME, connection="AzureWebJobsStorage")
+def ingestresume_job(req: func.HttpRequest, job_queue: func.Out[str]) -> func.HttpResponse:
+    """
+    Validate an ingest request, store its file and enqueue it for background processing.
+    Accepts the JSON body of ingestresume or the raw/multipart body of ingestresumebinary.
+    """
+    logging.info('Python job HTTP trigger function processed a request.')
+
+    try:
+        if is_json_body(req):
+            parsed = parse_ingest_request(req)
+            if isinstance(parsed, func.HttpResponse):
+                return parsed
+            file_url, file_content, tags, merge = parsed
+            file_bytes = decode_file_content(file_content)
+            del file_content, parsed
+        else:
+            parsed = parse_binary_ingest_request(req)
+            if isinstance(parsed, func.HttpResponse):
+                return parsed
+            file_url, file_bytes, tags, merge = parsed
+
+        job_id = str(uuid.uuid4())
+
+        # Store the payload, then the status record, then enqueue
+        get_job_container().upload_blob(f"{job_id}/payload", file_bytes, overwrite=True)
+        write_job_status(
+            job_id,
+            "queued",
+            created=datetime.utcnow().isoformat(),
+            file_url=file_url,
+            tags=tags,
+            attempts=0
+        )
+        job_queue.set(json.dumps({
+            "job_id": job_id,
+            "file_url": file_url,
+            "tags": tags,
+            "merge_tags": merge,
+            "compact_output": parse_compact_output(req)
+        }))
+
+        return json_response({
+            "status": "queued",
+            "job_id": job_id,
+            "status_url": f"/api/ingestresumejob/{job_id}",
+            "message": "Resume accepted for background processing"
+        }, 202)
+
+    except json.JSONDecodeError:
+        return error_response("Invalid JSON format in request body")
+    except Exception as e:
+        logging.error(f"Error queuing PDF: {str(e)}")
+        return error_response(f"Error queuing PDF: {str(e)}")
+
+@app.route(route="ingestresumejob/{job_id}",methods=["GET"])
+def ingestresume_job_status(req: func.HttpRequest) -> func.HttpResponse:
+    job_id = req.route_params.get("job_id", "")
+
+    try:
+        uuid.UUID(job_id)
+    except ValueError:
+        return error_response("Invalid job id")
+
+    try:
+        record = read_job_status(job_id)
+    except Exception as e:
+        logging.error(f"Error reading job status: {str(e)}")
+        return error_response(f"Error reading job status: {str(e)}", 500)
+
+    if record is None:
+        return error_response("Job not found", 404)
+
+    return json_response(record)
+
+@app.route(route="resumes/{document_id}/content",methods=["GET"])
+def resume_content(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Extracted text of a stored resume, which the document itself only references
+    """
+    document_id = req.route_params.get("document_id", "")
+
+    try:
+        document = read_resume_document(get_cosmos_container(), document_id)
+        if document is None:
+            return error_response("Resume not found", 404)
+        text = load_original_content(document)
+    except Exception as e:
+        logging.error(f"Error reading resume content: {str(e)}")
+        return error_response(f"Error reading resume content: {str(e)}", 500)
+
+    return func.HttpResponse(text, mimetype="text/plain", status_code=200)
+
+@app.queue_trigger(arg_name="msg", queue_name=INGEST_JOB_QUEUE_NAME, connection="AzureWebJobsStorage")
+def process_ingest_job(msg: func.QueueMessage) -> None:
+    """
+    Run the ingest pipeline for a queued job. Failures are re-raised so the runtime retries the
+    message; dedup makes a retry after a successful write return the existing document.
+    """
+    job = json.loads(msg.get_body().decode("utf-8"))
+    job_id = job["job_id"]
+    attempt = msg.dequeue_count or 1
+
+    logging.info(f"Processing ingest job {job_id} (attempt {attempt})")
+    write_job_status(job_id, "processing", attempts=attempt)
+
+    try:
+        payload = get_job_container().get_blob_client(f"{job_id}/payload")
+        file_bytes = payload.download_blob().readall()
+
+        result = ingest_document_bytes(job.get("file_url", ""), file_bytes, job.get("tags", ""), job.get("merge_tags", False), job.get("compact_output"))
+
+        write_job_status(job_id, "succeeded", result=result, completed=datetime.utcnow().isoformat())
+        payload.delete_blob()
+
+    except Exception as e:
+        logging.error(f"Error processing ingest job {job_id}: {str(e)}")
+        final = attempt >= INGEST_JOB_MAX_ATTEMPTS
+        write_job_status(job_id, "failed" if final else "retrying", error=str(e))
+        raise
+
+def get_batch_limits() -> dict:
+    """
+    Per-stage concurrency limits for batch ingestion
+    """
+    return {
+        "extract": asyncio.Semaphore(int(os.environ.get("BATCH_EXTRACT_CONCURRENCY", "4"))),
+        "ai": asyncio.Semaphore(int(os.environ.get("BATCH_AI_CONCURRENCY", "8"))),
+        "cosmos": asyncio.Semaphore(int(os.environ.get("BATCH_COSMOS_CONCURRENCY", "16")))
+    }
+
+async def ingest_batch_item(index: int, item, limits: dict, compact: bool = None) -> dict:
+    """
+    Ingest one item of a batch request, returning its per-item result instead of raising. An item's
+    CompactOutput overrides the request's `compact`.
+    """
+    try:
+        if not isinstance(item, dict):
+            raise ValueError("Item must be an object")
+
+        file_url = item.get("FileUrl", "")
+        file_content = item.get("FileContent", "")
+        tags = item.get("Tags", "")
+        merge = parse_bool(item.get("MergeTags", False))
+        if "CompactOutput" in item:
+            compact = parse_bool(item["CompactOutput"])
+
+        if not file_content:
+            raise ValueError("FileContent is required")
+
+        async with limits["extract"]:
+            file_bytes = await asyncio.to_thread(decode_file_content, file_content)
+
+        return dict(await ingest_document_bytes_async(file_url, file_bytes, tags, merge, limits, compact), index=index)
+
+    except Exception as e:
+        logging.error(f"Error processing batch item {index}: {str(e)}")
+        return {
+            "index": index,
+            "status": "error",
+            "file_url": item.get("FileUrl", "") if isinstance(item, dict) else "",
+            "message": f"Error processing PDF: {str(e)}"
+        }
+
+@app.route(route="ingestresumes",methods=["POST"])
+async def ingestresumes(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Batch ingest. Accepts an array of {FileUrl, FileContent, Tags} items (or {"Items": [...]}) and
+    runs extraction, AI calls and Cosmos writes concurrently within per-stage limits.
+    """
+    logging.info('Python batch HTTP trigger function processed a request.')
+
+    try:
+        req_body = req.get_json()
+    except ValueError:
+        return error_response("Invalid JSON format in request body")
+
+    items = req_body if isinstance(req_body, list) else (req_body or {}).get("Items")
+
+    if not isinstance(items, list) or not items:
+        return error_response("Items array is required")
+
+    max_items = int(os.environ.get("BATCH_MAX_ITEMS", "100"))
+    if len(items) > max_items:
+        return error_response(f"Batch contains {len(items)} items, the maximum is {max_items}")
+
+    limits = get_batch_limits()
+    compact = parse_compact_output(req)
+    results = await asyncio.gather(*(ingest_batch_item(index, item, limits, compact) for index, item in enumerate(items)))
+
+    succeeded = sum(1 for result in results if result["status"] == "success")
+
+    return json_response({
+        "status": "success" if succeeded == len(results) else "partial" if succeeded else "error",
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    })
+
+# Token budgeting. The resume text sent to the model is cut to a token budget rather than a fixed
+# character count, max_tokens is sized to the expected output instead of a flat 4096, and each
+# request's predicted cost is logged and totalled alongside the actual usage.
+#
+# tiktoken downloads its BPE files on first use. The build bundles them in tiktoken_cache/ (see the
+# deploy workflows) and the encoding is loaded at cold start, so no request waits on the network.
+BUNDLED_TIKTOKEN_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiktoken_cache")
+if os.path.isdir(BUNDLED_TIKTOKEN_CACHE_DIR):
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", BUNDLED_TIKTOKEN_CACHE_DIR)
+
+_token_encoding_lock = threading.Lock()
+_token_encoding = {}
+_llm_usage_lock = threading.Lock()
+_llm_usage_stats = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "predicted_cost": 0.0, "actual_cost": 0.0}
+_llm_usage_by_format = {}
+
+def get_token_encoding():
+    """
+    Tokenizer for the configured deployment, or None when it cannot be loaded
+    """
+    model = os.environ.get("AZURE_OPENAI_TOKENIZER_MODEL", os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o"))
+    with _token_encoding_lock:
+        if model in _token_encoding:
+            return _token_encoding[model]
+
+    # Load outside the lock so a slow load never stalls token counting on other threads
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Custom deployment names are not model names; gpt-4o family encoding
+            encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logging.warning(f"Tokenizer unavailable, estimating tokens from length: {str(e)}")
+        encoding = None
+
+    with _token_encoding_lock:
+        return _token_encoding.setdefault(model, encoding)
+
+# Cold start: load the tokenizer before the first request needs it
+get_token_encoding()
+
+def count_tokens(text: str) -> int:
+    encoding = get_token_encoding()
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+def get_prompt_token_budget() -> int:
+    return int(os.environ.get("PROMPT_TOKEN_BUDGET", "2000"))
+
+def prompt_window_chars() -> int:
+    """
+    Characters of extracted text that always cover the token budget; used to stop page extraction early
+    """
+    return get_prompt_token_budget() * 8
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    # Bound the text first so long documents are never tokenized in full
+    text = text[:budget * 8]
+    encoding = get_token_encoding()
+    if encoding is None:
+        return text[:budget * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= budget else encoding.decode(tokens[:budget])
+
+def get_max_output_tokens() -> int:
+    return int(os.environ.get("AZURE_OPENAI_MAX_OUTPUT_TOKENS", "4096"))
+
+def extraction_max_tokens(input_tokens: int, compact: bool = False) -> int:
+    """
+    Size max_tokens to the output the schema needs: the empty skeleton plus an allowance that grows
+    with the resume (more text, more skills and keywords)
+    """
+    skeleton_tokens = count_tokens(json.dumps(_schema_skeleton(COMPACT_EXTRACTION_SCHEMA if compact else RESUME_EXTRACTION_SCHEMA)))
+    ratio = float(os.environ.get("EXTRACTION_OUTPUT_TOKENS_PER_INPUT_TOKEN", "0.6"))
+    if compact:
+        ratio *= float(os.environ.get("COMPACT_OUTPUT_TOKEN_RATIO", "0.6"))
+    floor = int(os.environ.get("EXTRACTION_MIN_OUTPUT_TOKENS", "512"))
+    return min(get_max_output_tokens(), max(floor, skeleton_tokens + math.ceil(input_tokens * ratio)))
+
+def _llm_prices() -> tuple:
+    # USD per 1K tokens; defaults are gpt-4o global pay-as-you-go prices
+    return (
+        float(os.environ.get("AZURE_OPENAI_INPUT_PRICE_PER_1K", "0.0025")),
+        float(os.environ.get("AZURE_OPENAI_OUTPUT_PRICE_PER_1K", "0.01"))
+    )
+
+def predict_request_cost(prompt_tokens: int, max_tokens: int) -> float:
+    """
+    Upper-bound cost of a request whose output fills max_tokens
+    """
+    input_price, output_price = _llm_prices()
+    return (prompt_tokens * input_price + max_tokens * output_price) / 1000
+
+def record_llm_usage(usage, predicted_cost: float = 0.0, output_format: str = "full", seconds: float = 0.0):
+    """
+    Add a completion's usage to the totals; usage and latency are also kept per output format so the
+    compact and full formats can be compared
+    """
+    input_price, output_price = _llm_prices()
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    actual_cost = (prompt_tokens * input_price + completion_tokens * output_price) / 1000
+
+    with _llm_usage_lock:
+        _llm_usage_stats["requests"] += 1
+        _llm_usage_stats["prompt_tokens"] += prompt_tokens
+        _llm_usage_stats["completion_tokens"] += completion_tokens
+        _llm_usage_stats["predicted_cost"] += predicted_cost
+        _llm_usage_stats["actual_cost"] += actual_cost
+
+        by_format = _llm_usage_by_format.setdefault(output_format, {"requests": 0, "completion_tokens": 0, "seconds": 0.0})
+        by_format["requests"] += 1
+        by_format["completion_tokens"] += completion_tokens
+        by_format["seconds"] += seconds
+
+    logging.info(f"LLM usage: {prompt_tokens} prompt + {completion_tokens} completion tokens, ${actual_cost:.5f} (predicted ${predicted_cost:.5f})")
+
+def get_llm_usage_stats() -> dict:
+    with _llm_usage_lock:
+        stats = {name: round(value, 6) if isinstance(value, float) else value for name, value in _llm_usage_stats.items()}
+        stats["by_output_format"] = {
+            output_format: dict(
+                usage,
+                seconds=round(usage["seconds"], 3),
+                avg_completion_tokens=round(usage["completion_tokens"] / usage["requests"], 1),
+                avg_seconds=round(usage["seconds"] / usage["requests"], 3)
+            )
+            for output_format, usage in _llm_usage_by_format.items()
+        }
+        return stats
+
+def prepare_extraction_request(window: str, local: dict = None, compact: bool = False) -> dict:
+    """
+    Messages, max_tokens and predicted cost for extracting `window` (already cut to the token budget)
+    """
+    messages = build_extraction_messages(window, prompt_facts(local or {}), compact)
+    prompt_tokens = sum(count_tokens(message["content"]) for message in messages)
+    max_tokens = extraction_max_tokens(count_tokens(window), compact)
+    predicted_cost = predict_request_cost(prompt_tokens, max_tokens)
+
+    logging.info(f"Extraction prompt: {prompt_tokens} tokens, max_tokens {max_tokens}, predicted cost up to ${predicted_cost:.5f}")
+
+    return {"messages": messages, "max_tokens": max_tokens, "prompt_tokens": prompt_tokens, "predicted_cost": predicted_cost}
+
+# Client-side scheduler for Azure OpenAI. Token buckets track the deployment's tokens-per-minute
+# and requests-per-minute quota so callers queue for capacity instead of being throttled, a 429's
+# retry-after pauses every caller in the process, and transient failures are retried with jitter.
+class AIThrottledError(ServiceBusyError):
+    """Raised when an Azure OpenAI call is still throttled after all retries"""
+
+_openai_rate_lock = threading.Lock()
+_openai_rate_state = {
+    "tokens": None,
+    "requests": None,
+    "refilled_at": time.monotonic(),
+    "blocked_until": 0.0,
+    "throttled": 0,
+    "retries": 0,
+    "wait_seconds": 0.0
+}
+
+def _get_openai_rate_limits() -> tuple:
+    # 0 disables the corresponding bucket
+    tpm = int(os.environ.get("AZURE_OPENAI_TPM_LIMIT", "0"))
+    rpm = int(os.environ.get("AZURE_OPENAI_RPM_LIMIT", "0"))
+    return tpm, rpm
+
+def estimate_request_tokens(messages: list, max_tokens: int) -> int:
+    # Azure counts max_tokens against the TPM quota up front
+    return sum(count_tokens(message["content"]) for message in messages) + max_tokens
+
+def _reserve_openai_capacity(estimated_tokens: int) -> float:
+    """
+    Reserve quota for one request. Returns 0 when reserved, otherwise the seconds to wait before retrying.
+    """
+    tpm, rpm = _get_openai_rate_limits()
+
+    with _openai_rate_lock:
+        state = _openai_rate_state
+        now = time.monotonic()
+
+        # Refill both buckets for the time elapsed since the last reservation
+        elapsed = now - state["refilled_at"]
+        state["refilled_at"] = now
+        if tpm:
+            state["tokens"] = tpm if state["tokens"] is None else min(tpm, state["tokens"] + elapsed * tpm / 60)
+        if rpm:
+            state["requests"] = rpm if state["requests"] is None else min(rpm, state["requests"] + elapsed * rpm / 60)
+
+        if now < state["blocked_until"]:
+            return state["blocked_until"] - now
+
+        needed_tokens = min(estimated_tokens, tpm) if tpm else 0
+        wait = 0.0
+        if tpm and state["tokens"] < needed_tokens:
+            wait = max(wait, (needed_tokens - state["tokens"]) * 60 / tpm)
+        if rpm and state["requests"] < 1:
+            wait = max(wait, (1 - state["requests"]) * 60 / rpm)
+        if wait:
+            return wait
+
+        if tpm:
+            state["tokens"] -= needed_tokens
+        if rpm:
+            state["requests"] -= 1
+        return 0.0
+
+def _release_openai_capacity(estimated_tokens: int, used_tokens: int):
+    """
+    Return unused reserved tokens to the bucket once the actual usage is known
+    """
+    tpm, _ = _get_openai_rate_limits()
+    if not tpm:
+        return
+    with _openai_rate_lock:
+        if _openai_rate_state["tokens"] is not None:
+            refund = min(estimated_tokens, tpm) - used_tokens
+            _openai_rate_state["tokens"] = min(tpm, _openai_rate_state["tokens"] + max(refund, 0))
+
+def _get_max_queue_seconds() -> float:
+    return float(os.environ.get("AZURE_OPENAI_MAX_QUEUE_SECONDS", "120"))
+
+def _note_openai_wait(seconds: float):
+    with _openai_rate_lock:
+        _openai_rate_state["wait_seconds"] += seconds
+
+def _acquire_openai_capacity(estimated_tokens: int):
+    deadline = time.monotonic() + _get_max_queue_seconds()
+    while True:
+        wait = _reserve_openai_capacity(estimated_tokens)
+        if not wait:
+            return
+        if time.monotonic() + wait > deadline:
+            raise AIThrottledError("Timed out waiting for Azure OpenAI capacity")
+        _note_openai_wait(wait)
+        time.sleep(wait)
+
+async def _acquire_openai_capacity_async(estimated_tokens: int):
+    deadline = time.monotonic() + _get_max_queue_seconds()
+    while True:
+        wait = _reserve_openai_capacity(estimated_tokens)
+        if not wait:
+            return
+        if time.monotonic() + wait > deadline:
+            raise AIThrottledError("Timed out waiting for Azure OpenAI capacity")
+        _note_openai_wait(wait)
+        await asyncio.sleep(wait)
+
+def _retry_after_seconds(e: Exception):
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+def _openai_retry_delay(e: Exception, attempt: int):
+    """
+    Seconds to wait before retrying a failed call, or None when the error is not retryable
+    """
+    if not isinstance(e, (RateLimitError, APIConnectionError, InternalServerError)):
+        return None
+
+    retry_after = _retry_after_seconds(e)
+    if retry_after is not None:
+        delay = retry_after + random.uniform(0, 1)
+    else:
+        # Exponential backoff with full jitter
+        delay = random.uniform(0, min(60, 2 ** (attempt + 1)))
+
+    with _openai_rate_lock:
+        _openai_rate_state["retries"] += 1
+        if isinstance(e, RateLimitError):
+            # Pause every caller in this process, not just the one that was throttled
+            _openai_rate_state["throttled"] += 1
+            _openai_rate_state["blocked_until"] = max(_openai_rate_state["blocked_until"], time.monotonic() + delay)
+
+    return delay
+
+def _get_openai_max_retries() -> int:
+    return int(os.environ.get("AZURE_OPENAI_MAX_RETRIES", "6"))
+
+def create_chat_completion(messages: list, max_tokens: int, **kwargs):
+    """
+    Call chat.completions.create on the pooled client through the rate-limit scheduler
+    """
+    client = get_openai_client()
+    deployment = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o")
+    estimated_tokens = estimate_request_tokens(messages, max_tokens)
+    max_retries = _get_openai_max_retries()
+
+    for attempt in range(max_retries + 1):
+        _acquire_openai_capacity(estimated_tokens)
+        try:
+            response = client.chat.completions.create(model=deployment, messages=messages, max_tokens=max_tokens, **kwargs)
+        except Exception as e:
+            _release_openai_capacity(estimated_tokens, 0)
+            delay = _openai_retry_delay(e, attempt)
+            if delay is None:
+                raise
+            if attempt == max_retries:
+                if isinstance(e, RateLimitError):
+                    raise AIThrottledError(f"Azure OpenAI still throttled after {max_retries} retries")
+                raise
+            logging.warning(f"Azure OpenAI call failed ({str(e)}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        _release_openai_capacity(estimated_tokens, response.usage.total_tokens if response.usage else estimated_tokens)
+        return response
+
+async def create_chat_completion_async(messages: list, max_tokens: int, **kwargs):
+    """
+    Async variant of create_chat_completion using the pooled AsyncAzureOpenAI client
+    """
+    client = get_async_openai_client()
+    deployment = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o")
+    estimated_tokens = estimate_request_tokens(messages, max_tokens)
+    max_retries = _get_openai_max_retries()
+
+    for attempt in range(max_retries + 1):
+        await _acquire_openai_capacity_async(estimated_tokens)
+        try:
+            response = await client.chat.completions.create(model=deployment, messages=messages, max_tokens=max_tokens, **kwargs)
+        except Exception as e:
+            _release_openai_capacity(estimated_tokens, 0)
+            delay = _openai_retry_delay(e, attempt)
+            if delay is None:
+                raise
+            if attempt == max_retries:
+                if isinstance(e, RateLimitError):
+                    raise AIThrottledError(f"Azure OpenAI still throttled after {max_retries} retries")
+                raise
+            logging.warning(f"Azure OpenAI call failed ({str(e)}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        _release_openai_capacity(estimated_tokens, response.usage.total_tokens if response.usage else estimated_tokens)
+        return response
+
+def get_openai_rate_stats() -> dict:
+    tpm, rpm = _get_openai_rate_limits()
+    with _openai_rate_lock:
+        state = _openai_rate_state
+        return {
+            "tpm_limit": tpm,
+            "rpm_limit": rpm,
+            "tokens_available": state["tokens"],
+            "requests_available": state["requests"],
+            "blocked_for_seconds": max(0.0, state["blocked_until"] - time.monotonic()),
+            "throttled": state["throttled"],
+            "retries": state["retries"],
+            "wait_seconds": round(state["wait_seconds"], 3)
+        }
+
+def empty_extraction() -> dict:
+    """
+    Basic fallback structure used when AI extraction fails
+    """
+    return {
+        "personalInfo": {"name": "", "location": ""},
+        "skills": {"technical_skills": [], "soft_skills": []},
+        "experience": {"total_years": 0, "current_role": "", "industries": []},
+        "certifications": [],
+        "searchable_keywords": [],
+        "extractionMethod": "failed"
+    }
+
+# Extraction cache. AI results are keyed by the prompt version, the deployment and a hash of the
+# whitespace-normalized text window sent to the model, so re-exports of the same resume skip the
+# LLM call. The "disk" backend is per instance with TTL and LRU eviction by file mtime; the "blob"
+# backend is shared across instances, checks the TTL on read and leaves eviction to a storage
+# lifecycle policy.
+EXTRACTION_PROMPT_VERSION = "3"
+
+_extraction_cache_lock = threading.Lock()
+_extraction_cache_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+def _get_extraction_cache_backend() -> str:
+    return os.environ.get("EXTRACTION_CACHE_BACKEND", "disk").lower()
+
+def _get_extraction_cache_ttl() -> float:
+    return float(os.environ.get("EXTRACTION_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+def _get_extraction_cache_dir() -> str:
+    return os.environ.get("EXTRACTION_CACHE_DIR", os.path.join(tempfile.gettempdir(), "resume-extraction-cache"))
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+def is_segmentation_enabled() -> bool:
+    return os.environ.get("PROMPT_SEGMENTATION_ENABLED", "true").lower() in ("1", "true", "yes")
+
+def prompt_window(resume_text: str, headings: list = None) -> str:
+    """
+    The part of the resume text that is sent to the model, cut to PROMPT_TOKEN_BUDGET tokens. With
+    segmentation on, the contact header, Experience, Skills and Certifications are kept first and
+    sections the schema does not use (references, hobbies, publications, disclaimers) are dropped.
+    `headings` are layout headings from the PDF that help find sections.
+    """
+    budget = get_prompt_token_budget()
+    if not is_segmentation_enabled():
+        return truncate_to_tokens(resume_text, budget)
+
+    # Segment only the text page extraction would have gathered for the window anyway
+    window = resume_sections.select_sections(resume_text[:prompt_window_chars()], budget, count_tokens, truncate_to_tokens, headings)
+    logging.info(f"Prompt segmentation: {len(window)} of {len(resume_text)} characters kept")
+    return window
+
+def extraction_cache_key(window: str, local: dict = None, compact: bool = False) -> str:
+    deployment = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o")
+    mode = "structured" if is_structured_output_enabled() else "json"
+    if compact:
+        mode += "-compact"
+    # Locally extracted facts are part of the prompt, so they are part of the key
+    key_source = "\n".join([EXTRACTION_PROMPT_VERSION, mode, deployment, prompt_facts(local or {}), normalize_text(window)])
+    return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+def _count_extraction_cache(stat: str, amount: int = 1):
+    with _extraction_cache_lock:
+        _extraction_cache_stats[stat] += amount
+
+def _disk_cache_get(key: str):
+    path = os.path.join(_get_extraction_cache_dir(), f"{key}.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if time.time() - entry.get("created", 0) > _get_extraction_cache_ttl():
+        with contextlib.suppress(OSError):
+            os.remove(path)
+        return None
+
+    # Touch the file so eviction drops the least recently used entries first
+    with contextlib.suppress(OSError):
+        os.utime(path)
+    return entry.get("data")
+
+def _disk_cache_put(key: str, data: dict):
+    cache_dir = _get_extraction_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Write to a temp file and rename so concurrent readers never see a partial entry
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"created": time.time(), "data": data}, f)
+    os.replace(tmp_path, os.path.join(cache_dir, f"{key}.json"))
+
+    max_entries = int(os.environ.get("EXTRACTION_CACHE_MAX_ENTRIES", "5000"))
+    entries = [entry for entry in os.scandir(cache_dir) if entry.name.endswith(".json")]
+    if len(entries) > max_entries:
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        evicted = 0
+        for entry in entries[:len(entries) - max_entries]:
+            with contextlib.suppress(OSError):
+                os.remove(entry.path)
+                evicted += 1
+        _count_extraction_cache("evictions", evicted)
+
+def _blob_cache_container():
+    return get_storage_container(os.environ.get("EXTRACTION_CACHE_CONTAINER_NAME", "resume-extraction-cache"))
+
+def _blob_cache_get(key: str):
+    blob = _blob_cache_container().get_blob_client(f"{key}.json")
+    try:
+        entry = json.loads(blob.download_blob().readall())
+    except Exception:
+        return None
+
+    if time.time() - entry.get("created", 0) > _get_extraction_cache_ttl():
+        return None
+    return entry.get("data")
+
+def _blob_cache_put(key: str, data: dict):
+    blob = _blob_cache_container().get_blob_client(f"{key}.json")
+    blob.upload_blob(json.dumps({"created": time.time(), "data": data}), overwrite=True)
+
+def extraction_cache_get(key: str):
+    """
+    Return the cached AI extraction for `key`, or None
+    """
+    backend = _get_extraction_cache_backend()
+    try:
+        if backend == "disk":
+            data = _disk_cache_get(key)
+        elif backend == "blob":
+            data = _blob_cache_get(key)
+        else:
+            return None
+    except Exception as e:
+        logging.warning(f"Extraction cache read failed: {str(e)}")
+        data = None
+
+    _count_extraction_cache("hits" if data is not None else "misses")
+    return data
+
+def extraction_cache_put(key: str, data: dict):
+    backend = _get_extraction_cache_backend()
+    try:
+        if backend == "disk":
+            _disk_cache_put(key, data)
+        elif backend == "blob":
+            _blob_cache_put(key, data)
+        else:
+            return
+        _count_extraction_cache("writes")
+    except Exception as e:
+        # The cache is an optimization; never fail an ingest because of it
+        logging.warning(f"Extraction cache write failed: {str(e)}")
+
+def get_extraction_cache_stats() -> dict:
+    with _extraction_cache_lock:
+        return dict(_extraction_cache_stats, backend=_get_extraction_cache_backend())
+
+# JSON schema of the AI extraction. Used as the response_format in structured-output mode and
+# compiled into a coercer that normalizes every parsed response (e.g. "5+ years" -> 5).
+_string_array = {"type": "array", "items": {"type": "string"}}
+
+RESUME_EXTRACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "personalInfo": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string"},
+                "location": {"type": "string"}
+            }
+        },
+        "skills": {
+            "type": "object",
+            "properties": {
+                "technical_skills": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "skill": {"type": "string"},
+                            "proficiency": {"type": "string", "enum": ["Beginner", "Intermediate", "Advanced", "Expert"]},
+                            "years": {"type": "number"}
+                        }
+                    }
                 },
-                "message": "Resume processed and uploaded to Cosmos DB successfully"
-            }),
-            mimetype="application/json",
-            status_code=200
-        )
-        
-    except json.JSONDecodeError:
-        return func.HttpResponse(
-            json.dumps({
-                "status": "error",
-                "message": "Invalid JSON format in request body"
-            }),
-            mimetype="application/json",
-            status_code=400
+                "soft_skills": _string_array
+            }
+        },
+        "experience": {
+            "type": "object",
+            "properties": {
+                "total_years": {"type": "number"},
+                "current_role": {"type": "string"},
+                "industries": _string_array
+            }
+        },
+        "certifications": _string_array,
+        "searchable_keywords": _string_array
+    }
+}
+
+_number_pattern = re.compile(r"-?\d+(?:\.\d+)?")
+
+def _strict_schema(schema: dict) -> dict:
+    """
+    Schema in the form strict structured outputs requires: every property required, no extra properties
+    """
+    if schema["type"] == "object":
+        return {
+            "type": "object",
+            "properties": {name: _strict_schema(child) for name, child in schema["properties"].items()},
+            "required": list(schema["properties"]),
+            "additionalProperties": False
+        }
+    if schema["type"] == "array":
+        return {"type": "array", "items": _strict_schema(schema["items"])}
+    return dict(schema)
+
+def _compile_coercer(schema: dict):
+    """
+    Build a function that coerces a parsed value to `schema`, filling defaults for missing fields.
+    The schema is walked once here rather than on every response.
+    """
+    schema_type = schema["type"]
+
+    if schema_type == "object":
+        fields = [(name, _compile_coercer(child)) for name, child in schema["properties"].items()]
+        def coerce_object(value):
+            value = value if isinstance(value, dict) else {}
+            return {name: coerce(value.get(name)) for name, coerce in fields}
+        return coerce_object
+
+    if schema_type == "array":
+        coerce_item = _compile_coercer(schema["items"])
+        item_is_string = schema["items"]["type"] == "string"
+        def coerce_array(value):
+            if not isinstance(value, list):
+                return []
+            items = [coerce_item(item) for item in value if item is not None]
+            return [item for item in items if item] if item_is_string else items
+        return coerce_array
+
+    if schema_type == "number":
+        def coerce_number(value):
+            if isinstance(value, bool):
+                return 0
+            if isinstance(value, (int, float)):
+                return value
+            match = _number_pattern.search(str(value or ""))
+            if not match:
+                return 0
+            number = float(match.group())
+            return int(number) if number.is_integer() else number
+        return coerce_number
+
+    enum = {option.lower(): option for option in schema.get("enum", [])}
+    def coerce_string(value):
+        if value is None:
+            return ""
+        value = str(value).strip()
+        return enum.get(value.lower(), value) if enum else value
+    return coerce_string
+
+coerce_extraction = _compile_coercer(RESUME_EXTRACTION_SCHEMA)
+
+def _schema_skeleton(schema: dict):
+    if schema["type"] == "object":
+        return {name: _schema_skeleton(child) for name, child in schema["properties"].items()}
+    return {"array": [], "number": 0}.get(schema["type"], "")
+
+# Compact wire format. The model can be asked for the same data with single-letter keys and
+# one-letter enum codes ("E" for Expert), which cuts output tokens; the response is expanded back
+# to RESUME_EXTRACTION_SCHEMA locally. Keys only need to be unique within their object.
+COMPACT_KEYS = {
+    "personalInfo": "p", "name": "n", "location": "l",
+    "skills": "s", "technical_skills": "t", "skill": "n", "proficiency": "p", "years": "y", "soft_skills": "s",
+    "experience": "e", "total_years": "y", "current_role": "r", "industries": "i",
+    "certifications": "c", "searchable_keywords": "k"
+}
+
+def _compact_schema(schema: dict) -> dict:
+    if schema["type"] == "object":
+        return {"type": "object", "properties": {COMPACT_KEYS[name]: _compact_schema(child) for name, child in schema["properties"].items()}}
+    if schema["type"] == "array":
+        return {"type": "array", "items": _compact_schema(schema["items"])}
+    if "enum" in schema:
+        return dict(schema, enum=[option[0] for option in schema["enum"]])
+    return dict(schema)
+
+def _compile_expander(schema: dict):
+    """
+    Build a function that maps a compact response back to the keys and enum values of `schema`
+    """
+    schema_type = schema["type"]
+
+    if schema_type == "object":
+        fields = [(name, COMPACT_KEYS[name], _compile_expander(child)) for name, child in schema["properties"].items()]
+        def expand_object(value):
+            value = value if isinstance(value, dict) else {}
+            return {name: expand(value.get(short)) for name, short, expand in fields}
+        return expand_object
+
+    if schema_type == "array":
+        expand_item = _compile_expander(schema["items"])
+        return lambda value: [expand_item(item) for item in value] if isinstance(value, list) else value
+
+    if "enum" in schema:
+        codes = {option[0].lower(): option for option in schema["enum"]}
+        return lambda value: codes.get(str(value).strip().lower(), value) if value is not None else value
+
+    return lambda value: value
+
+COMPACT_EXTRACTION_SCHEMA = _compact_schema(RESUME_EXTRACTION_SCHEMA)
+expand_compact_extraction = _compile_expander(RESUME_EXTRACTION_SCHEMA)
+
+def is_compact_output_default() -> bool:
+    return os.environ.get("COMPACT_OUTPUT_DEFAULT", "false").lower() in ("1", "true", "yes")
+
+def parse_compact_output(req: func.HttpRequest):
+    """
+    Per-request output format from the compactOutput query parameter or X-Compact-Output header;
+    None when the request does not choose
+    """
+    value = req.params.get("compactOutput") or req.headers.get("X-Compact-Output")
+    return None if value is None else parse_bool(value)
+
+def is_structured_output_enabled() -> bool:
+    return os.environ.get("AZURE_OPENAI_STRUCTURED_OUTPUT", "false").lower() in ("1", "true", "yes")
+
+def extraction_response_format(compact: bool = False) -> dict:
+    """
+    Extra chat completion arguments for the configured output mode
+    """
+    if not is_structured_output_enabled():
+        return {}
+    return {
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "resume_extraction_compact" if compact else "resume_extraction",
+                "strict": True,
+                "schema": _strict_schema(COMPACT_EXTRACTION_SCHEMA if compact else RESUME_EXTRACTION_SCHEMA)
+            }
+        }
+    }
+
+def is_skill_matcher_enabled() -> bool:
+    return os.environ.get("SKILL_MATCHER_ENABLED", "true").lower() in ("1", "true", "yes")
+
+def get_skill_fast_mode() -> str:
+    """
+    When to skip the model and store only locally extracted data: "off", "throttled" or "always"
+    """
+    return os.environ.get("SKILL_FAST_MODE", "off").lower()
+
+def is_experience_dates_enabled() -> bool:
+    return os.environ.get("EXPERIENCE_DATES_ENABLED", "true").lower() in ("1", "true", "yes")
+
+def local_extraction(resume_text: str, layout: dict = None) -> dict:
+    """
+    Fields extracted without the model: contacts (see contact_extraction), taxonomy skills with
+    their mention counts (see skill_matcher) and employment dates (see experience_dates)
+    """
+    layout = layout or {}
+    experience = {}
+    if is_experience_dates_enabled():
+        match_skills = skill_matcher.match_skills if is_skill_matcher_enabled() else None
+        experience = experience_dates.compute_experience(resume_text, layout.get("headings"), match_skills)
+
+    return {
+        "contacts": contact_extraction.extract_contacts(resume_text, layout.get("links")),
+        "skills": skill_matcher.match_skills(resume_text) if is_skill_matcher_enabled() else {},
+        "experience": experience
+    }
+
+def prompt_facts(local: dict) -> str:
+    """
+    Instructions telling the model what was already extracted locally, so it rates rather than finds
+    """
+    facts = ""
+    if local.get("skills"):
+        facts += (
+            f"- These technical skills were already found in the resume: {', '.join(local['skills'])}. "
+            "Return proficiency and years for them using these exact names; add other technical skills only if clearly present\n"
         )
-    except Exception as e:
-        logging.error(f"Error processing PDF: {str(e)}")
-        return func.HttpResponse(
-            json.dumps({
-                "status": "error",
-                "message": f"Error processing PDF: {str(e)}"
-            }),
-            mimetype="application/json",
-            status_code=400
+
+    experience = local.get("experience")
+    if experience and os.environ.get("EXPERIENCE_FACTS_IN_PROMPT", "true").lower() in ("1", "true", "yes"):
+        positions = "; ".join(f"{position['title'] or 'untitled'} ({position['start']} to {position['end']})" for position in experience["positions"])
+        facts += (
+            f"- Employment dates parsed from the resume give {experience['total_years']} years of experience in total "
+            f"(overlapping positions counted once). Positions: {positions}. Use these dates for total_years and per-skill years\n"
         )
+    return facts
 
-def extract_resume_data_with_ai(resume_text: str) -> dict:
+def merge_known_skills(technical_skills: list, known_skills: dict) -> list:
     """
-    Extract skills, experience, education, and keywords from resume text using Azure OpenAI
+    Normalize the model's skill names to the taxonomy and add matched skills the model left out
     """
-    try:
-        # Initialize Azure OpenAI client
-        azure_openai_endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
-        azure_openai_key = os.environ.get("AZURE_OPENAI_KEY")
-        azure_openai_deployment = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o")
-        azure_openai_api_version = os.environ.get("AZURE_OPENAI_API_VERSION", "2024-12-01-preview")
-        
-        if not azure_openai_endpoint or not azure_openai_key:
-            raise ValueError("Azure OpenAI connection settings not found in environment variables")
-        
-        client = AzureOpenAI(
-            azure_endpoint=azure_openai_endpoint,
-            api_key=azure_openai_key,
-            api_version=azure_openai_api_version
-        )
-        
-        # Create prompt for extracting structured data according to new schema
+    merged = {}
+    for skill in technical_skills:
+        name = skill_matcher.canonical_skill(skill["skill"]) if is_skill_matcher_enabled() else skill["skill"]
+        if name and name not in merged:
+            merged[name] = dict(skill, skill=name)
+    for name in known_skills:
+        merged.setdefault(name, {"skill": name, "proficiency": "", "years": 0})
+    return list(merged.values())
+
+def apply_local_extraction(extracted_data: dict, local: dict) -> dict:
+    """
+    Merge locally extracted fields into the model's output. Email, phone and profile URLs come only
+    from the pre-extractor; a location it found wins over the model's.
+    """
+    contacts = local.get("contacts", {})
+    personal_info = dict(extracted_data.get("personalInfo", {}))
+    for field in ("email", "phone", "linkedin", "github"):
+        personal_info[field] = contacts.get(field, "")
+    personal_info["location"] = contacts.get("location") or personal_info.get("location", "")
+
+    skills = dict(extracted_data.get("skills", {}))
+    skills["technical_skills"] = merge_known_skills(skills.get("technical_skills", []), local.get("skills", {}))
+
+    # Years computed from employment dates are stable across runs; prefer them to the model's estimates
+    experience = dict(extracted_data.get("experience", {}))
+    local_experience = local.get("experience")
+    if local_experience:
+        skill_years = local_experience["skill_years"]
+        skills["technical_skills"] = [
+            dict(skill, years=skill_years[skill["skill"]]) if skill_years.get(skill["skill"]) else skill
+            for skill in skills["technical_skills"]
+        ]
+        experience["total_years"] = local_experience["total_years"]
+        experience["current_role"] = experience.get("current_role") or local_experience["current_position"]["title"]
+        experience["positions"] = local_experience["positions"]
+
+    return dict(extracted_data, personalInfo=personal_info, skills=skills, experience=experience)
+
+def fast_extraction(local: dict) -> dict:
+    """
+    Extraction result built from local data only, used by the no-LLM fast mode
+    """
+    extracted_data = apply_local_extraction(empty_extraction(), local)
+    extracted_data["extractionMethod"] = "local"
+    return extracted_data
+
+def build_extraction_messages(resume_text: str, facts: str = "", compact: bool = False) -> list:
+    """
+    Build the chat messages asking the model to extract structured resume data.
+    `resume_text` is sent as is; callers cut it with prompt_window first. `facts` are extra
+    instructions about locally extracted data (see prompt_facts). With `compact`, the model is
+    asked for the compact wire format (see COMPACT_KEYS).
+    """
+    if compact:
         prompt = f"""
+        Analyze the following resume text and extract structured information. Return the response as a valid, minified JSON object using these short keys:
+
+        {{"p":{{"n":"full name","l":"city, state/country if found"}},"s":{{"t":[{{"n":"skill name","p":"B|I|A|E","y":estimated_years}}],"s":["soft skills"]}},"e":{{"y":total_years,"r":"most recent job title","i":["industries"]}},"c":["certifications"],"k":["search keywords"]}}
+
+        Keys: p=personal info (n=name, l=location); s=skills (t=technical skills with n=skill, p=proficiency, y=years; s=soft skills); e=experience (y=total years, r=current role, i=industries); c=certifications; k=searchable keywords.
+        Proficiency codes: B=Beginner, I=Intermediate, A=Advanced, E=Expert.
+
+        Instructions:
+        - For technical skills, estimate proficiency based on context, years mentioned, or job responsibilities
+        - For years of experience per skill, estimate based on job history and mentions in resume
+        - Extract total years of experience from the entire career
+        - Identify current/most recent role from work history
+        - List industries the candidate has worked in
+        - Include both technical and soft skills
+        - Generate searchable keywords that would help find this candidate
+        {facts}
+        Resume Text:
+        {resume_text}
+        """
+
+        return [
+            {"role": "system", "content": "You are an expert resume parser. Extract structured information from resumes and return valid JSON only, using the short keys you are given. Be precise with proficiency levels and experience years."},
+            {"role": "user", "content": prompt}
+        ]
+
+    # Create prompt for extracting structured data according to new schema
+    prompt = f"""
         Analyze the following resume text and extract structured information. Return the response as a valid JSON object with the following structure:
 
         {{
             "personalInfo": {{
                 "name": "Full name of the candidate",
-                "email": "email address if found",
                 "location": "city, state/country if found"
             }},
             "skills": {{
@@ -162,193 +2128,465 @@ def extract_resume_data_with_ai(resume_text: str) -> dict:
         - List industries the candidate has worked in
         - Include both technical and soft skills
         - Generate searchable keywords that would help find this candidate
-
+        {facts}
         Resume Text:
-        {resume_text[:6000]}
+        {resume_text}
         """
-        
-        # Make API call to Azure OpenAI
-        response = client.chat.completions.create(
-            model=azure_openai_deployment,
-            messages=[
-                {"role": "system", "content": "You are an expert resume parser. Extract structured information from resumes and return valid JSON only. Be precise with proficiency levels and experience years."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=4096,
-            temperature=0.1,
-            top_p=1.0
-        )
-        
-        # Parse the response
-        ai_response = response.choices[0].message.content
-        
-        # Handle None response
-        if ai_response is None:
-            ai_response = ""
-        
-        # Clean the response to ensure it's valid JSON
-        if ai_response.startswith("```json"):
-            ai_response = ai_response[7:]
-        if ai_response.endswith("```"):
-            ai_response = ai_response[:-3]
-        
-        ai_response = ai_response.strip()
-        
+
+    return [
+        {"role": "system", "content": "You are an expert resume parser. Extract structured information from resumes and return valid JSON only. Be precise with proficiency levels and experience years."},
+        {"role": "user", "content": prompt}
+    ]
+
+def parse_ai_response(ai_response, compact: bool = False) -> dict:
+    """
+    Parse the model output into a dict matching RESUME_EXTRACTION_SCHEMA, stripping markdown code fences.
+    Compact responses are expanded first. Raises ValueError on invalid JSON.
+    """
+    # Handle None response
+    if ai_response is None:
+        ai_response = ""
+
+    # Clean the response to ensure it's valid JSON
+    if ai_response.startswith("```json"):
+        ai_response = ai_response[7:]
+    if ai_response.endswith("```"):
+        ai_response = ai_response[:-3]
+
+    ai_response = ai_response.strip()
+
+    try:
         # Parse JSON response
         extracted_data = json.loads(ai_response)
-        
-        logging.info(f"AI extraction successful: {len(extracted_data.get('skills', {}).get('technical_skills', []))} technical skills extracted")
-        
-        return extracted_data
-        
     except json.JSONDecodeError as e:
         logging.error(f"Failed to parse AI response as JSON: {str(e)}")
         logging.error(f"AI Response: {ai_response}")
-        # Return basic fallback structure
-        return {
-            "personalInfo": {"name": "", "email": "", "location": ""},
-            "skills": {"technical_skills": [], "soft_skills": []},
-            "experience": {"total_years": 0, "current_role": "", "industries": []},
-            "certifications": [],
-            "searchable_keywords": []
-        }
+        raise
+
+    if compact:
+        extracted_data = expand_compact_extraction(extracted_data)
+    extracted_data = coerce_extraction(extracted_data)
+
+    logging.info(f"AI extraction successful: {len(extracted_data.get('skills', {}).get('technical_skills', []))} technical skills extracted")
+
+    return extracted_data
+
+def extract_resume_data_with_ai(resume_text: str, layout: dict = None, compact: bool = None) -> dict:
+    """
+    Extract skills, experience, education, and keywords from resume text using Azure OpenAI.
+    Contacts and taxonomy skills are extracted locally first (see local_extraction) and merged in.
+    `compact` selects the compact wire format; None uses COMPACT_OUTPUT_DEFAULT.
+    """
+    # Nothing to extract from (e.g. a scan that OCR could not read)
+    if not resume_text.strip():
+        logging.warning("Resume text is empty, skipping AI extraction")
+        return apply_local_extraction(empty_extraction(), {})
+
+    local = local_extraction(resume_text, layout)
+    if get_skill_fast_mode() == "always":
+        return fast_extraction(local)
+
+    compact = is_compact_output_default() if compact is None else compact
+    output_format = "compact" if compact else "full"
+
+    try:
+        window = prompt_window(resume_text, (layout or {}).get("headings"))
+
+        # Skip the model entirely when the same text was extracted before
+        cache_key = extraction_cache_key(window, local, compact)
+        cached = extraction_cache_get(cache_key)
+        if cached is not None:
+            logging.info("AI extraction served from cache")
+            return dict(apply_local_extraction(cached, local), outputFormat=output_format)
+
+        request = prepare_extraction_request(window, local, compact)
+
+        # Make API call to Azure OpenAI through the rate-limit scheduler
+        started = time.monotonic()
+        response = create_chat_completion(
+            request["messages"],
+            max_tokens=request["max_tokens"],
+            temperature=0.1,
+            top_p=1.0,
+            **extraction_response_format(compact)
+        )
+        record_llm_usage(response.usage, request["predicted_cost"], output_format, time.monotonic() - started)
+
+        # A truncated answer is invalid JSON; retry once with the full output allowance
+        if response.choices[0].finish_reason == "length" and request["max_tokens"] < get_max_output_tokens():
+            logging.warning(f"Extraction output hit max_tokens ({request['max_tokens']}), retrying with {get_max_output_tokens()}")
+            started = time.monotonic()
+            response = create_chat_completion(
+                request["messages"],
+                max_tokens=get_max_output_tokens(),
+                temperature=0.1,
+                top_p=1.0,
+                **extraction_response_format(compact)
+            )
+            record_llm_usage(response.usage, predict_request_cost(request["prompt_tokens"], get_max_output_tokens()), output_format, time.monotonic() - started)
+
+        # Parse the response
+        extracted_data = parse_ai_response(response.choices[0].message.content, compact)
+
+        extraction_cache_put(cache_key, extracted_data)
+
+        return dict(apply_local_extraction(extracted_data, local), outputFormat=output_format)
+
+    except AIThrottledError:
+        if get_skill_fast_mode() == "throttled":
+            logging.warning("Azure OpenAI is throttled, storing locally extracted data only")
+            return fast_extraction(local)
+        # Surface throttling to the caller instead of storing an empty record
+        raise
     except Exception as e:
         logging.error(f"Error extracting data with AI: {str(e)}")
-        # Return basic fallback structure
-        return {
-            "personalInfo": {"name": "", "email": "", "location": ""},
-            "skills": {"technical_skills": [], "soft_skills": []},
-            "experience": {"total_years": 0, "current_role": "", "industries": []},
-            "certifications": [],
-            "searchable_keywords": []
+        if _is_auth_error(e):
+            invalidate_client("openai")
+        return apply_local_extraction(empty_extraction(), local)
+
+async def extract_resume_data_with_ai_async(resume_text: str, layout: dict = None, compact: bool = None) -> dict:
+    """
+    Async variant of extract_resume_data_with_ai using AsyncAzureOpenAI
+    """
+    # Nothing to extract from (e.g. a scan that OCR could not read)
+    if not resume_text.strip():
+        logging.warning("Resume text is empty, skipping AI extraction")
+        return apply_local_extraction(empty_extraction(), {})
+
+    # Skill matching, segmentation and date parsing are CPU work; keep them off the event loop
+    local = await asyncio.to_thread(local_extraction, resume_text, layout)
+    if get_skill_fast_mode() == "always":
+        return fast_extraction(local)
+
+    compact = is_compact_output_default() if compact is None else compact
+    output_format = "compact" if compact else "full"
+
+    try:
+        # Tokenizing and segmenting the window is CPU work; keep it off the event loop
+        window = await asyncio.to_thread(prompt_window, resume_text, (layout or {}).get("headings"))
+
+        # Skip the model entirely when the same text was extracted before
+        cache_key = extraction_cache_key(window, local, compact)
+        cached = await asyncio.to_thread(extraction_cache_get, cache_key)
+        if cached is not None:
+            logging.info("AI extraction served from cache")
+            return dict(apply_local_extraction(cached, local), outputFormat=output_format)
+
+        request = await asyncio.to_thread(prepare_extraction_request, window, local, compact)
+
+        # Make API call to Azure OpenAI through the rate-limit scheduler
+        started = time.monotonic()
+        response = await create_chat_completion_async(
+            request["messages"],
+            max_tokens=request["max_tokens"],
+            temperature=0.1,
+            top_p=1.0,
+            **extraction_response_format(compact)
+        )
+        record_llm_usage(response.usage, request["predicted_cost"], output_format, time.monotonic() - started)
+
+        # A truncated answer is invalid JSON; retry once with the full output allowance
+        if response.choices[0].finish_reason == "length" and request["max_tokens"] < get_max_output_tokens():
+            logging.warning(f"Extraction output hit max_tokens ({request['max_tokens']}), retrying with {get_max_output_tokens()}")
+            started = time.monotonic()
+            response = await create_chat_completion_async(
+                request["messages"],
+                max_tokens=get_max_output_tokens(),
+                temperature=0.1,
+                top_p=1.0,
+                **extraction_response_format(compact)
+            )
+            record_llm_usage(response.usage, predict_request_cost(request["prompt_tokens"], get_max_output_tokens()), output_format, time.monotonic() - started)
+
+        # Parse the response
+        extracted_data = parse_ai_response(response.choices[0].message.content, compact)
+
+        await asyncio.to_thread(extraction_cache_put, cache_key, extracted_data)
+
+        return dict(apply_local_extraction(extracted_data, local), outputFormat=output_format)
+
+    except AIThrottledError:
+        if get_skill_fast_mode() == "throttled":
+            logging.warning("Azure OpenAI is throttled, storing locally extracted data only")
+            return fast_extraction(local)
+        # Surface throttling to the caller instead of storing an empty record
+        raise
+    except Exception as e:
+        logging.error(f"Error extracting data with AI: {str(e)}")
+        if _is_auth_error(e):
+            invalidate_client("openai_async")
+        return apply_local_extraction(empty_extraction(), local)
+
+def build_resume_document(file_url: str, resume_text: str, tags: str, ai_extracted_data: dict, content_hash: str = "", document_type: dict = None) -> dict:
+    """
+    Build the Cosmos DB document for a resume from the AI extracted data
+    """
+    document_type = document_type or document_extractors.get_document_type("pdf")
+
+    # Extract filename from SharePoint URL for better searchability
+    filename = ""
+    if file_url:
+        filename = file_url.split("/")[-1] if "/" in file_url else file_url
+
+    # Generate searchable text from extracted data
+    searchable_parts = []
+
+    # Add personal info
+    personal_info = ai_extracted_data.get("personalInfo", {})
+    if personal_info.get("name"):
+        searchable_parts.append(personal_info["name"].lower())
+    if personal_info.get("location"):
+        searchable_parts.append(personal_info["location"].lower())
+
+    # Add technical skills
+    technical_skills = ai_extracted_data.get("skills", {}).get("technical_skills", [])
+    for skill_obj in technical_skills:
+        if isinstance(skill_obj, dict) and "skill" in skill_obj:
+            searchable_parts.append(skill_obj["skill"].lower())
+
+    # Add soft skills
+    soft_skills = ai_extracted_data.get("skills", {}).get("soft_skills", [])
+    searchable_parts.extend([skill.lower() for skill in soft_skills])
+
+    # Add experience info
+    experience = ai_extracted_data.get("experience", {})
+    if experience.get("current_role"):
+        searchable_parts.append(experience["current_role"].lower())
+
+    industries = experience.get("industries", [])
+    searchable_parts.extend([industry.lower() for industry in industries])
+
+    # Add certifications
+    certifications = ai_extracted_data.get("certifications", [])
+    searchable_parts.extend([cert.lower() for cert in certifications])
+
+    # Add searchable keywords, with known skills under their canonical names
+    keywords = ai_extracted_data.get("searchable_keywords", [])
+    if is_skill_matcher_enabled():
+        keywords = [skill_matcher.canonical_skill(keyword) for keyword in keywords]
+    searchable_parts.extend([keyword.lower() for keyword in keywords])
+
+    # Add tags to searchable text, split by common delimiters
+    searchable_parts.extend([tag.lower() for tag in split_tags(tags)])
+
+    # Create final searchable text
+    searchable_text = " ".join(set(searchable_parts))  # Remove duplicates
+
+    # Only documents the model actually processed count as AI processed
+    extraction_method = ai_extracted_data.get("extractionMethod", "azure_openai")
+
+    # Create document according to new schema
+    document = {
+        "id": resume_document_id(content_hash, file_url, personal_info.get("email", "")),
+        "tags": tags,
+        "personalInfo": {
+            "name": personal_info.get("name", ""),
+            "email": personal_info.get("email", ""),
+            "phone": personal_info.get("phone", ""),
+            "location": personal_info.get("location", ""),
+            "linkedin": personal_info.get("linkedin", ""),
+            "github": personal_info.get("github", "")
+        },
+        "skills": {
+            "technical_skills": technical_skills,
+            "soft_skills": soft_skills
+        },
+        "experience": {
+            "total_years": experience.get("total_years", 0),
+            "current_role": experience.get("current_role", ""),
+            "industries": industries,
+            "positions": experience.get("positions", [])
+        },
+        "certifications": certifications,
+        "searchable_text": searchable_text,
+
+        # Additional metadata for system use
+        "metadata": {
+            "fileUrl": file_url,
+            "filename": filename,
+            "contentLength": len(resume_text),
+            "contentHash": content_hash,
+            "uploadTimestamp": datetime.utcnow().isoformat(),
+            "source": f"sharepoint_{document_type['kind']}",
+            "processingMethod": "pymupdf" if document_type["pymupdf_filetype"] else f"native_{document_type['kind']}",
+            "extractionMethod": extraction_method,
+            "outputFormat": ai_extracted_data.get("outputFormat", ""),
+            "version": "3.0",
+            "contentType": document_type["content_type"],
+            "aiProcessed": extraction_method == "azure_openai"
         }
+    }
+
+    return partitioning.apply_partition_key(document)
+
+def log_upload_result(result: dict):
+    logging.info(f"Successfully uploaded resume to Cosmos DB with ID: {result['id']}")
+    logging.info(f"Candidate: {result.get('personalInfo', {}).get('name') or 'Unknown'}")
+    logging.info(f"Technical skills: {len(result.get('skills', {}).get('technical_skills', []))}")
+    logging.info(f"Total experience: {result.get('experience', {}).get('total_years', 0)} years")
+    logging.info(f"Current role: {result.get('experience', {}).get('current_role') or 'Unknown'}")
+
+def _replacement_document(existing: dict, document: dict):
+    """
+    What to write over `existing` for the same id: None when it already holds this file (a retry),
+    otherwise `document` keeping the existing tags and first upload time
+    """
+    if existing.get("metadata", {}).get("contentHash") == document["metadata"]["contentHash"]:
+        return None
+    _apply_tag_merge(document, existing.get("tags", ""))
+    document["metadata"]["firstUploadTimestamp"] = existing.get("metadata", {}).get("firstUploadTimestamp") or existing.get("metadata", {}).get("uploadTimestamp")
+    return document
+
+def _get_write_attempts() -> int:
+    return int(os.environ.get("COSMOS_CONDITIONAL_WRITE_ATTEMPTS", "3"))
+
+def write_resume_document(container, document: dict) -> dict:
+    """
+    Idempotent write of a resume document. Creates it when the id is new; otherwise replaces the
+    existing document with an ETag-conditional upsert, re-reading and retrying when another writer
+    got there first. Re-writing the same file returns the stored document without a write.
+    """
+    for _ in range(_get_write_attempts()):
+        # While a migration may still hold the id in the legacy partition, look there first so the
+        # write replaces that document instead of creating a second one in the new partition
+        existing = read_resume_document(container, document["id"]) if len(partitioning.read_partition_keys(document["id"])) > 1 else None
+        if existing is None:
+            try:
+                return container.create_item(document)
+            except CosmosHttpResponseError as e:
+                if e.status_code != 409:
+                    raise
+
+            try:
+                existing = container.read_item(item=document["id"], partition_key=partitioning.document_partition_key(document))
+            except CosmosHttpResponseError as e:
+                if e.status_code == 404:
+                    continue  # deleted in between; create again
+                raise
+
+        replacement = _replacement_document(existing, document)
+        if replacement is None:
+            logging.info(f"Document {existing['id']} already holds this file, skipping write")
+            return existing
+        # Replace it where it lives; partition_migration moves legacy documents
+        replacement["partition_key"] = existing.get("partition_key", replacement.get("partition_key"))
+
+        try:
+            return container.upsert_item(replacement, etag=existing["_etag"], match_condition=MatchConditions.IfNotModified)
+        except CosmosHttpResponseError as e:
+            if e.status_code not in (404, 412):
+                raise
+            logging.info(f"Document {existing['id']} changed concurrently, retrying write")
+
+    raise Exception(f"Conflicting concurrent writes to document {document['id']}")
+
+async def write_resume_document_async(container, document: dict) -> dict:
+    """
+    Async variant of write_resume_document
+    """
+    for _ in range(_get_write_attempts()):
+        # While a migration may still hold the id in the legacy partition, look there first so the
+        # write replaces that document instead of creating a second one in the new partition
+        existing = await read_resume_document_async(container, document["id"]) if len(partitioning.read_partition_keys(document["id"])) > 1 else None
+        if existing is None:
+            try:
+                return await container.create_item(document)
+            except CosmosHttpResponseError as e:
+                if e.status_code != 409:
+                    raise
+
+            try:
+                existing = await container.read_item(item=document["id"], partition_key=partitioning.document_partition_key(document))
+            except CosmosHttpResponseError as e:
+                if e.status_code == 404:
+                    continue  # deleted in between; create again
+                raise
+
+        replacement = _replacement_document(existing, document)
+        if replacement is None:
+            logging.info(f"Document {existing['id']} already holds this file, skipping write")
+            return existing
+        # Replace it where it lives; partition_migration moves legacy documents
+        replacement["partition_key"] = existing.get("partition_key", replacement.get("partition_key"))
 
-def upload_to_cosmos_db(file_url: str, resume_text: str, tags: str) -> dict:
+        try:
+            return await container.upsert_item(replacement, etag=existing["_etag"], match_condition=MatchConditions.IfNotModified)
+        except CosmosHttpResponseError as e:
+            if e.status_code not in (404, 412):
+                raise
+            logging.info(f"Document {existing['id']} changed concurrently, retrying write")
+
+    raise Exception(f"Conflicting concurrent writes to document {document['id']}")
+
+def upload_to_cosmos_db(file_url: str, resume_text: str, tags: str, content_hash: str = "", ai_extracted_data: dict = None, document_type: dict = None) -> dict:
     """
-    Upload resume text and file URL to Cosmos DB for vectorization
+    Upload resume text and file URL to Cosmos DB for vectorization.
+    AI extraction runs here unless `ai_extracted_data` was already computed.
     """
     try:
-        # Get Cosmos DB connection settings from environment variables
-        cosmos_endpoint = os.environ.get("COSMOS_ENDPOINT")
-        cosmos_key = os.environ.get("COSMOS_KEY")
-        database_name = os.environ.get("COSMOS_DATABASE_NAME", "exploredb")
-        container_name = os.environ.get("COSMOS_CONTAINER_NAME", "resumes")
-        
-        if not cosmos_endpoint or not cosmos_key:
-            raise ValueError("Cosmos DB connection settings not found in environment variables")
-        
-        # Initialize Cosmos DB client
-        cosmos_client = CosmosClient(cosmos_endpoint, cosmos_key)
-        
-        # Get database and container
-        database = cosmos_client.get_database_client(database_name)
-        container = database.get_container_client(container_name)
-        
-        # Extract filename from SharePoint URL for better searchability
-        filename = ""
-        if file_url:
-            filename = file_url.split("/")[-1] if "/" in file_url else file_url
-        
+        # Get the pooled Cosmos DB container
+        container = get_cosmos_container()
+
         # Extract data using AI
-        ai_extracted_data = extract_resume_data_with_ai(resume_text)
-        
-        # Generate searchable text from extracted data
-        searchable_parts = []
-        
-        # Add personal info
-        personal_info = ai_extracted_data.get("personalInfo", {})
-        if personal_info.get("name"):
-            searchable_parts.append(personal_info["name"].lower())
-        if personal_info.get("location"):
-            searchable_parts.append(personal_info["location"].lower())
-        
-        # Add technical skills
-        technical_skills = ai_extracted_data.get("skills", {}).get("technical_skills", [])
-        for skill_obj in technical_skills:
-            if isinstance(skill_obj, dict) and "skill" in skill_obj:
-                searchable_parts.append(skill_obj["skill"].lower())
-        
-        # Add soft skills
-        soft_skills = ai_extracted_data.get("skills", {}).get("soft_skills", [])
-        searchable_parts.extend([skill.lower() for skill in soft_skills])
-        
-        # Add experience info
-        experience = ai_extracted_data.get("experience", {})
-        if experience.get("current_role"):
-            searchable_parts.append(experience["current_role"].lower())
-        
-        industries = experience.get("industries", [])
-        searchable_parts.extend([industry.lower() for industry in industries])
-        
-        # Add certifications
-        certifications = ai_extracted_data.get("certifications", [])
-        searchable_parts.extend([cert.lower() for cert in certifications])
-        
-        # Add searchable keywords
-        keywords = ai_extracted_data.get("searchable_keywords", [])
-        searchable_parts.extend([keyword.lower() for keyword in keywords])
-        
-        # Add tags to searchable text
-        if tags:
-            # Split tags by common delimiters and add to searchable text
-            tag_list = tags.replace(",", " ").replace(";", " ").replace("|", " ").split()
-            searchable_parts.extend([tag.lower().strip() for tag in tag_list if tag.strip()])
-        
-        # Create final searchable text
-        searchable_text = " ".join(set(searchable_parts))  # Remove duplicates
-        
-        # Create document according to new schema
-        document = {
-            "id": str(uuid.uuid4()),
-            "partition_key": "active",
-            "tags": tags,
-            "personalInfo": {
-                "name": personal_info.get("name", ""),
-                "email": personal_info.get("email", ""),
-                "location": personal_info.get("location", "")
-            },
-            "skills": {
-                "technical_skills": technical_skills,
-                "soft_skills": soft_skills
-            },
-            "experience": {
-                "total_years": experience.get("total_years", 0),
-                "current_role": experience.get("current_role", ""),
-                "industries": industries
-            },
-            "certifications": certifications,
-            "searchable_text": searchable_text,
-            
-            # Additional metadata for system use
-            "metadata": {
-                "fileUrl": file_url,
-                "filename": filename,
-                "originalContent": resume_text,
-                "contentLength": len(resume_text),
-                "uploadTimestamp": datetime.utcnow().isoformat(),
-                "source": "sharepoint_pdf",
-                "processingMethod": "pymupdf",
-                "extractionMethod": "azure_openai",
-                "version": "3.0",
-                "contentType": "application/pdf",
-                "aiProcessed": True
-            }
-        }
-        
+        if ai_extracted_data is None:
+            ai_extracted_data = extract_resume_data_with_ai(resume_text)
+
+        document = build_resume_document(file_url, resume_text, tags, ai_extracted_data, content_hash, document_type)
+        store_original_content(document, resume_text)
+
+        # Upload to Cosmos DB
+        result = write_resume_document(container, document)
+
+        log_upload_result(result)
+        remember_content_hash(content_hash, result["id"])
+
+        return result
+
+    except ServiceBusyError:
+        raise
+    except CosmosHttpResponseError as e:
+        logging.error(f"Cosmos DB error: {str(e)}")
+        if _is_auth_error(e):
+            invalidate_client("cosmos")
+        raise Exception(f"Failed to upload to Cosmos DB: {str(e)}")
+    except Exception as e:
+        logging.error(f"Error uploading to Cosmos DB: {str(e)}")
+        raise Exception(f"Failed to upload to Cosmos DB: {str(e)}")
+
+async def upload_to_cosmos_db_async(file_url: str, resume_text: str, tags: str, content_hash: str = "", limits: dict = None, ai_extracted_data: dict = None, document_type: dict = None) -> dict:
+    """
+    Async variant of upload_to_cosmos_db using the azure.cosmos.aio container client.
+    `limits` optionally holds "ai" and "cosmos" semaphores bounding each stage.
+    """
+    limits = limits or {}
+    try:
+        # Get the pooled async Cosmos DB container
+        container = get_async_cosmos_container()
+
+        # Extract data using AI
+        if ai_extracted_data is None:
+            async with limits.get("ai") or contextlib.nullcontext():
+                ai_extracted_data = await extract_resume_data_with_ai_async(resume_text)
+
+        document = build_resume_document(file_url, resume_text, tags, ai_extracted_data, content_hash, document_type)
+        await asyncio.to_thread(store_original_content, document, resume_text)
+
         # Upload to Cosmos DB
-        result = container.create_item(document)
-        
-        logging.info(f"Successfully uploaded resume to Cosmos DB with ID: {result['id']}")
-        logging.info(f"Candidate: {personal_info.get('name', 'Unknown')}")
-        logging.info(f"Technical skills: {len(technical_skills)}")
-        logging.info(f"Total experience: {experience.get('total_years', 0)} years")
-        logging.info(f"Current role: {experience.get('current_role', 'Unknown')}")
-        
+        async with limits.get("cosmos") or contextlib.nullcontext():
+            result = await write_resume_document_async(container, document)
+
+        log_upload_result(result)
+        remember_content_hash(content_hash, result["id"])
+
         return result
-        
+
+    except ServiceBusyError:
+        raise
     except CosmosHttpResponseError as e:
         logging.error(f"Cosmos DB error: {str(e)}")
+        if _is_auth_error(e):
+            invalidate_client("cosmos_async")
         raise Exception(f"Failed to upload to Cosmos DB: {str(e)}")
     except Exception as e:
         logging.error(f"Error uploading to Cosmos DB: {str(e)}")
-        raise Exception(f"Failed to upload to Cosmos DB: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Failed to upload to Cosmos DB: {str(e)}")
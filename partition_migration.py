@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+from azure.core import MatchConditions
+from azure.cosmos import CosmosClient
+from azure.cosmos.exceptions import CosmosHttpResponseError
+import partitioning
+
+# Online migration of resumes to a partition scheme (see partitioning.py). Items are read from the
+# source container's change feed, so documents written or updated while the migration runs are
+# picked up too, and written with their new partition key into the target container unless it
+# already holds a newer version of the item. Running in place (same container, "hash" scheme)
+# deletes each item from its old partition once copied.
+# Progress is checkpointed after every page, and request units are spent through a token bucket so
+# the migration stays under --max-ru-per-second alongside production traffic.
+#
+#   python partition_migration.py --scheme hash
+#   python partition_migration.py --scheme hierarchical --target-container resumes-v2 --create-target --follow
+SYSTEM_PROPERTIES = ("_rid", "_self", "_etag", "_attachments", "_ts", "_lsn")
+
+def request_charge(container) -> float:
+    return float(container.client_connection.last_response_headers.get("x-ms-request-charge", 0) or 0)
+
+def new_ru_budget(max_ru_per_second: float) -> dict:
+    return {"rate": max_ru_per_second, "available": max_ru_per_second, "updated": time.monotonic(), "spent": 0.0, "throttled_seconds": 0.0}
+
+def spend_request_units(budget: dict, charge: float):
+    """
+    Deduct `charge` from the budget, sleeping until it refills when it is overdrawn
+    """
+    now = time.monotonic()
+    budget["available"] = min(budget["rate"], budget["available"] + (now - budget["updated"]) * budget["rate"])
+    budget["updated"] = now
+    budget["available"] -= charge
+    budget["spent"] += charge
+    if budget["available"] < 0:
+        wait = -budget["available"] / budget["rate"]
+        budget["throttled_seconds"] += wait
+        time.sleep(wait)
+
+def load_checkpoint(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"continuation": None, "copied": 0, "moved": 0, "skipped": 0, "request_units": 0.0}
+
+def save_checkpoint(path: str, checkpoint: dict):
+    # Write to a temp file and rename so an interrupted run never leaves a partial checkpoint
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+def read_target(target, item_id: str, partition_key, budget: dict):
+    try:
+        existing = target.read_item(item=item_id, partition_key=partition_key)
+    except CosmosHttpResponseError as e:
+        if e.status_code != 404:
+            raise
+        existing = None
+    spend_request_units(budget, request_charge(target))
+    return existing
+
+def migrate_item(source, target, item: dict, scheme: str, in_place: bool, budget: dict) -> str:
+    """
+    Copy one item to its partition under `scheme`. Returns "copied", "moved" or "skipped".
+    """
+    # Only /partition_key containers can be migrated in place, so that is where the item lives now
+    old_key = item.get("partition_key")
+    if in_place and old_key == partitioning.partition_key_for(item["id"], scheme):
+        return "skipped"
+
+    document = {name: value for name, value in item.items() if name not in SYSTEM_PROPERTIES}
+    partitioning.apply_partition_key(document, scheme)
+
+    # The app may already have written the id under the new scheme, and re-processing a page after
+    # a crash meets the earlier copy. Only a target older than this item is replaced, and only if it
+    # is unchanged since it was read.
+    existing = read_target(target, document["id"], partitioning.document_partition_key(document, scheme), budget)
+    newer = existing is None or existing.get("_ts", 0) < item.get("_ts", 0)
+    if newer:
+        try:
+            if existing is None:
+                target.create_item(document)
+            else:
+                target.upsert_item(document, etag=existing["_etag"], match_condition=MatchConditions.IfNotModified)
+            spend_request_units(budget, request_charge(target))
+        except CosmosHttpResponseError as e:
+            # Written concurrently, so the target now holds a newer version
+            if e.status_code not in (409, 412):
+                raise
+            newer = False
+
+    if not in_place:
+        return "copied" if newer else "skipped"
+
+    # Only delete the old copy as it was read; a change since then comes through the feed again
+    try:
+        source.delete_item(item=item["id"], partition_key=old_key, etag=item["_etag"], match_condition=MatchConditions.IfNotModified)
+        spend_request_units(budget, request_charge(source))
+    except CosmosHttpResponseError as e:
+        if e.status_code not in (404, 412):
+            raise
+    return "moved"
+
+def run_migration(source, target, scheme: str, checkpoint_path: str, max_ru_per_second: float, page_size: int = 100, follow: bool = False, poll_seconds: float = 5.0) -> dict:
+    """
+    Migrate items from the change feed of `source` into `target`, resuming from the checkpoint.
+    Returns the final checkpoint. With `follow`, keeps polling for new changes until interrupted.
+    """
+    in_place = source.id == target.id
+    if in_place and scheme == "hierarchical":
+        raise ValueError("The hierarchical scheme needs a new container with a /tenant, /status, /id partition key")
+
+    checkpoint = load_checkpoint(checkpoint_path)
+    budget = new_ru_budget(max_ru_per_second)
+    previous_request_units = checkpoint["request_units"]
+
+    while True:
+        feed_args = {"continuation": checkpoint["continuation"]} if checkpoint["continuation"] else {"is_start_from_beginning": True}
+        processed = 0
+
+        for page in source.query_items_change_feed(max_item_count=page_size, **feed_args).by_page():
+            items = list(page)
+            spend_request_units(budget, request_charge(source))
+            continuation = source.client_connection.last_response_headers.get("etag")
+
+            for item in items:
+                result = migrate_item(source, target, item, scheme, in_place, budget)
+                checkpoint[result] += 1
+
+            processed += len(items)
+            checkpoint["continuation"] = continuation
+            checkpoint["request_units"] = round(previous_request_units + budget["spent"], 2)
+            save_checkpoint(checkpoint_path, checkpoint)
+            logging.info(f"Migrated page of {len(items)} items: {checkpoint['copied']} copied, {checkpoint['moved']} moved, {checkpoint['skipped']} skipped")
+
+            if not items:
+                break
+
+        if not follow:
+            break
+        if not processed:
+            time.sleep(poll_seconds)
+
+    checkpoint["throttled_seconds"] = round(budget["throttled_seconds"], 1)
+    return checkpoint
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy resumes to a new partition key scheme with checkpointing and a request unit bound")
+    parser.add_argument("--scheme", default=partitioning.get_partition_scheme(), choices=["single", "hash", "hierarchical"])
+    parser.add_argument("--source-container", default=os.environ.get("COSMOS_CONTAINER_NAME", "resumes"))
+    parser.add_argument("--target-container", help="defaults to the source container (in-place migration)")
+    parser.add_argument("--create-target", action="store_true", help="create the target container with the scheme's partition key")
+    parser.add_argument("--checkpoint", default="partition_migration.checkpoint.json")
+    parser.add_argument("--max-ru-per-second", type=float, default=float(os.environ.get("MIGRATION_MAX_RU_PER_SECOND", "400")))
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--follow", action="store_true", help="keep copying new changes until interrupted")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    endpoint = os.environ.get("COSMOS_ENDPOINT")
+    key = os.environ.get("COSMOS_KEY")
+    if not endpoint or not key:
+        raise SystemExit("COSMOS_ENDPOINT and COSMOS_KEY must be set")
+
+    database = CosmosClient(endpoint, key).get_database_client(os.environ.get("COSMOS_DATABASE_NAME", "exploredb"))
+    source = database.get_container_client(args.source_container)
+    target_name = args.target_container or args.source_container
+    if args.create_target and target_name != args.source_container:
+        database.create_container_if_not_exists(id=target_name, partition_key=partitioning.container_partition_key(args.scheme))
+    target = database.get_container_client(target_name)
+
+    try:
+        checkpoint = run_migration(source, target, args.scheme, args.checkpoint, args.max_ru_per_second, args.page_size, args.follow)
+    except KeyboardInterrupt:
+        checkpoint = load_checkpoint(args.checkpoint)
+        logging.info("Interrupted; rerun to resume from the checkpoint")
+
+    logging.info(f"Migration checkpoint: {json.dumps(checkpoint)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import os
+import hashlib
+from azure.cosmos import PartitionKey
+
+# Partition key schemes for the resumes container. "single" keeps every document in the legacy
+# "active" logical partition. "hash" spreads documents over PARTITION_BUCKET_COUNT synthetic
+# buckets ("active-07") derived from the document id, in the same /partition_key container.
+# "hierarchical" keys documents by tenant, status and document id and needs a container created
+# with the MultiHash key /tenant, /status, /id (see container_partition_key and
+# partition_migration.py). The id as last level spreads a tenant over as many logical partitions
+# as it has documents, while queries stay scoped to the tenant's partitions through the
+# [tenant, status] prefix.
+LEGACY_PARTITION_KEY = "active"
+DOCUMENT_STATUS = "active"
+
+def get_partition_scheme() -> str:
+    return os.environ.get("PARTITION_KEY_SCHEME", "single").lower()
+
+def get_partition_bucket_count() -> int:
+    return int(os.environ.get("PARTITION_BUCKET_COUNT", "32"))
+
+def get_tenant_id() -> str:
+    return os.environ.get("RESUME_TENANT_ID", "default")
+
+def partition_bucket(document_id: str, bucket_count: int = None) -> int:
+    digest = hashlib.sha256(document_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % (bucket_count or get_partition_bucket_count())
+
+def partition_key_for(document_id: str, scheme: str = None):
+    """
+    Partition key value of the document with `document_id` under `scheme`, as passed to the SDK
+    """
+    scheme = scheme or get_partition_scheme()
+    if scheme == "hash":
+        return f"{DOCUMENT_STATUS}-{partition_bucket(document_id):02d}"
+    if scheme == "hierarchical":
+        return [get_tenant_id(), DOCUMENT_STATUS, document_id]
+    return LEGACY_PARTITION_KEY
+
+def apply_partition_key(document: dict, scheme: str = None) -> dict:
+    """
+    Set the partition key fields of `document` in place for `scheme`
+    """
+    scheme = scheme or get_partition_scheme()
+    key = partition_key_for(document["id"], scheme)
+    if scheme == "hierarchical":
+        document["tenant"], document["status"], _ = key
+        document["partition_key"] = f"{document['tenant']}/{document['status']}"
+    else:
+        document["partition_key"] = key
+    return document
+
+def document_partition_key(document: dict, scheme: str = None):
+    """
+    Partition key value of a stored document under `scheme`
+    """
+    if (scheme or get_partition_scheme()) == "hierarchical":
+        return [document.get("tenant"), document.get("status"), document.get("id")]
+    return document.get("partition_key")
+
+def read_partition_keys(document_id: str) -> list:
+    """
+    Partition keys to try when reading a document by id. With the hash scheme the legacy partition
+    is tried last while a migration may still be in progress.
+    """
+    keys = [partition_key_for(document_id)]
+    if get_partition_scheme() == "hash" and os.environ.get("PARTITION_KEY_LEGACY_FALLBACK", "true").lower() in ("1", "true", "yes"):
+        keys.append(LEGACY_PARTITION_KEY)
+    return keys
+
+def query_partition_args(is_async: bool = False) -> dict:
+    """
+    Keyword arguments scoping a query over resumes: a single partition where the scheme allows it,
+    the [tenant, status] key prefix for the hierarchical scheme, otherwise a cross-partition query
+    """
+    scheme = get_partition_scheme()
+    if scheme == "single":
+        return {"partition_key": LEGACY_PARTITION_KEY}
+    if scheme == "hierarchical":
+        return {"partition_key": [get_tenant_id(), DOCUMENT_STATUS]}
+    # The aio client queries across partitions without being asked
+    return {} if is_async else {"enable_cross_partition_query": True}
+
+def container_partition_key(scheme: str = None) -> PartitionKey:
+    """
+    Partition key definition a container needs for `scheme`
+    """
+    if (scheme or get_partition_scheme()) == "hierarchical":
+        return PartitionKey(path=["/tenant", "/status", "/id"], kind="MultiHash")
+    return PartitionKey(path="/partition_key")
@@ -0,0 +1,220 @@
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+import pymupdf
+from multiprocessing.shared_memory import SharedMemory
+
+# Page-level PDF functions shared by the request thread and the CPU worker pool. Kept out of
+# function_app.py so worker processes only import PyMuPDF instead of the whole Functions app.
+
+# Selective OCR. Pages whose text layer is (nearly) empty but which are mostly covered by images
+# are treated as scanned and sent through PyMuPDF's Tesseract integration. OCR is bounded per
+# process and results are cached on disk by a hash of the page's content and image streams, so
+# re-processing a scanned resume does not pay for OCR again.
+_ocr_semaphore = threading.BoundedSemaphore(int(os.environ.get("OCR_MAX_CONCURRENCY", "2")))
+
+def is_ocr_enabled() -> bool:
+    return os.environ.get("OCR_ENABLED", "true").lower() in ("1", "true", "yes")
+
+def _area(rect) -> float:
+    return max(rect.width, 0) * max(rect.height, 0)
+
+def needs_ocr(page, text: str) -> bool:
+    """
+    Cheap classifier for image-only pages: few glyphs, images covering much of the page and
+    little text area relative to image area
+    """
+    glyph_count = sum(1 for char in text if not char.isspace())
+    if glyph_count >= int(os.environ.get("OCR_MAX_GLYPHS", "50")):
+        return False
+
+    page_area = _area(page.rect)
+    if not page_area:
+        return False
+
+    image_area = sum(_area(pymupdf.Rect(info["bbox"]) & page.rect) for info in page.get_image_info())
+    if image_area / page_area < float(os.environ.get("OCR_MIN_IMAGE_COVERAGE", "0.3")):
+        return False
+
+    text_area = sum(_area(pymupdf.Rect(block[:4])) for block in page.get_text("blocks") if block[6] == 0)
+    return text_area <= image_area * float(os.environ.get("OCR_MAX_TEXT_IMAGE_RATIO", "0.1"))
+
+def page_hash(page) -> str:
+    """
+    Hash of the page's content stream and the raw streams of the images it draws. Pages of image
+    documents (PNG, JPEG, TIFF) have no content stream, so their rendered pixels are hashed instead.
+    """
+    if not page.parent.is_pdf:
+        return hashlib.sha256(page.get_pixmap().samples).hexdigest()
+
+    digest = hashlib.sha256(page.read_contents())
+    for image in page.get_images(full=True):
+        digest.update(page.parent.xref_stream_raw(image[0]) or b"")
+    return digest.hexdigest()
+
+def _ocr_cache_path(key: str) -> str:
+    cache_dir = os.environ.get("OCR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "resume-ocr-cache"))
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, f"{key}.txt")
+
+def ocr_page_text(page) -> str:
+    """
+    OCR a page, serving repeated pages from the cache. Returns None when OCR is unavailable.
+    """
+    try:
+        path = _ocr_cache_path(page_hash(page))
+    except Exception as e:
+        logging.warning(f"Could not hash page {page.number} for the OCR cache: {str(e)}")
+        path = None
+
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            pass
+
+    try:
+        with _ocr_semaphore:
+            textpage = page.get_textpage_ocr(
+                language=os.environ.get("OCR_LANGUAGE", "eng"),
+                dpi=int(os.environ.get("OCR_DPI", "300")),
+                full=True
+            )
+            text = page.get_text(textpage=textpage)
+    except Exception as e:
+        # Typically Tesseract / tessdata not installed
+        logging.warning(f"OCR failed for page {page.number}: {str(e)}")
+        return None
+
+    if not path:
+        return text
+
+    # Write to a temp file and rename so concurrent readers never see a partial entry
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"OCR cache write failed: {str(e)}")
+
+    return text
+
+def page_text(page) -> str:
+    """
+    Plain text of a page with a newline separator, OCR'd when the page looks scanned
+    """
+    text = page.get_text()
+    if is_ocr_enabled() and needs_ocr(page, text):
+        text = ocr_page_text(page) or text
+    return text + "\n"
+
+def page_headings(page) -> list:
+    """
+    Short lines set in a larger font than the page's body text, or entirely in bold. Used by the
+    resume segmenter to recognise section headings the text alone does not give away.
+    """
+    ratio = float(os.environ.get("SEGMENTATION_HEADING_FONT_RATIO", "1.15"))
+    lines = []
+    body_sizes = {}
+
+    for block in page.get_text("dict")["blocks"]:
+        if block.get("type") != 0:
+            continue
+        for line in block["lines"]:
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                continue
+            text = "".join(span["text"] for span in spans).strip()
+            size = max(span["size"] for span in spans)
+            bold = all(span["flags"] & pymupdf.TEXT_FONT_BOLD for span in spans)
+            lines.append((text, size, bold))
+            for span in spans:
+                body_sizes[round(span["size"], 1)] = body_sizes.get(round(span["size"], 1), 0) + len(span["text"])
+
+    if not lines:
+        return []
+
+    # Body text size: the size that sets the most characters
+    body_size = max(body_sizes, key=body_sizes.get)
+    return [text for text, size, bold in lines if len(text) <= 60 and (bold or size >= body_size * ratio)]
+
+def page_links(page) -> list:
+    """
+    Targets of the page's URI link annotations (mailto:, LinkedIn and GitHub profiles, ...)
+    """
+    return [link["uri"] for link in page.get_links() if link.get("kind") == pymupdf.LINK_URI and link.get("uri")]
+
+def page_layout(pages) -> dict:
+    """
+    Layout hints for the resume parser: headings (see page_headings) and link targets of `pages`
+    """
+    layout = {"headings": [], "links": []}
+    for page in pages:
+        layout["headings"].extend(page_headings(page))
+        layout["links"].extend(page_links(page))
+    return layout
+
+def warmup() -> int:
+    """
+    No-op task used to start worker processes ahead of the first real request
+    """
+    return os.getpid()
+
+def attach_shared_memory(shm_name: str) -> SharedMemory:
+    """
+    Attach to a shared memory block owned by the parent process
+    """
+    # Workers are spawned, so they share the parent's resource tracker: attaching registers the
+    # name again (a no-op), and the parent's unlink removes the single registration. Unregistering
+    # here would drop the parent's entry, making the tracker report a KeyError on unlink and leak
+    # the block if the host dies.
+    return SharedMemory(name=shm_name)
+
+def _with_shared_pdf(shm_name: str, size: int, work):
+    """
+    Open the PDF held in shared memory and call work(doc). PyMuPDF only opens bytes-like streams it
+    owns, so the worker copies the document out of the block once.
+    """
+    shm = attach_shared_memory(shm_name)
+    try:
+        pdf_bytes = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+
+    doc = pymupdf.Document(stream=pdf_bytes, filetype="pdf")
+    try:
+        return work(doc)
+    finally:
+        doc.close()
+
+def extract_prompt_head(shm_name: str, size: int, window_chars: int, with_layout: bool = False) -> tuple:
+    """
+    Extract page texts until they fill `window_chars`. Returns (page_texts, page_count, layout),
+    where layout is page_layout of those pages (None unless `with_layout`).
+    """
+    def work(doc):
+        head = []
+        length = 0
+        for page in doc:
+            text = page_text(page)
+            head.append(text)
+            length += len(text)
+            if length >= window_chars:
+                break
+        layout = page_layout(doc[page_number] for page_number in range(len(head))) if with_layout else None
+        return head, doc.page_count, layout
+
+    return _with_shared_pdf(shm_name, size, work)
+
+def extract_page_range(shm_name: str, size: int, start: int, stop: int) -> str:
+    """
+    Extract the plain text of pages [start, stop)
+    """
+    def work(doc):
+        return "".join(page_text(doc[page_number]) for page_number in range(start, stop))
+
+    return _with_shared_pdf(shm_name, size, work)
@@ -0,0 +1,117 @@
+import re
+
+# Heuristic resume segmentation. Lines are matched against a lexicon of section headings; headings
+# detected from the PDF layout (larger or bold fonts, see pdf_workers.page_headings) and short
+# all-caps lines may add a few heading words to a lexicon entry ("Professional Experience &
+# Internships"). Bold job titles are common, so a lexicon word inside a longer line ("Head of
+# Education Programs", "Data Protection Officer") never makes it a heading. The prompt is then assembled from the sections the
+# extraction schema needs, in priority order, so references, hobbies, publication lists and
+# disclaimers no longer take up the token budget.
+SECTION_HEADINGS = {
+    "summary": ("summary", "profile", "professional summary", "career summary", "professional profile", "objective", "career objective", "about me"),
+    "experience": ("experience", "work experience", "professional experience", "relevant experience", "employment", "employment history", "work history", "career history", "professional background", "positions held"),
+    "skills": ("skills", "technical skills", "key skills", "core skills", "skills and tools", "core competencies", "competencies", "technologies", "technical expertise", "expertise", "tools and technologies", "tech stack"),
+    "certifications": ("certifications", "certification", "certificates", "licenses", "licenses and certifications", "certifications and licenses", "accreditations", "professional certifications"),
+    "projects": ("projects", "key projects", "selected projects", "personal projects"),
+    "education": ("education", "academic background", "education and training", "qualifications", "academic qualifications"),
+    "languages": ("languages", "language skills"),
+    "awards": ("awards", "honors", "honours", "achievements", "awards and honors"),
+    "volunteering": ("volunteering", "volunteer experience", "community involvement"),
+    "publications": ("publications", "selected publications", "papers", "patents", "conferences", "presentations"),
+    "references": ("references", "referees", "references available upon request", "references available on request"),
+    "interests": ("interests", "hobbies", "hobbies and interests", "personal interests", "activities", "extracurricular activities"),
+    "disclaimer": ("declaration", "disclaimer", "confidentiality", "data protection", "gdpr")
+}
+
+# Sections that go into the prompt, most important first; anything else is left out
+SECTION_PRIORITY = ("header", "experience", "skills", "certifications", "summary", "projects", "education", "languages", "awards", "volunteering")
+
+_HEADING_LOOKUP = {heading: section for section, headings in SECTION_HEADINGS.items() for heading in headings}
+_HEADING_PREFIXES = sorted(_HEADING_LOOKUP, key=len, reverse=True)
+# Words a heading may add to a lexicon entry; anything else (a job title, a company) means the
+# line is not a heading
+_HEADING_WORDS = {word for heading in _HEADING_LOOKUP for word in heading.split()} | {
+    "and", "of", "other", "additional", "highlights", "overview", "details", "internships", "internship",
+    "training", "courses", "coursework", "tools", "history", "list"
+}
+_HEADING_CLEANUP = re.compile(r"[^a-z ]+")
+MAX_HEADING_CHARS = 60
+MAX_HEADING_WORDS = 4
+
+def normalize_heading(line: str) -> str:
+    line = line.lower().replace("&", " and ")
+    return " ".join(_HEADING_CLEANUP.sub(" ", line).split())
+
+def classify_heading(line: str, layout_heading: bool = False):
+    """
+    Section name if `line` is a section heading, else None
+    """
+    stripped = line.strip()
+    if not stripped or len(stripped) > MAX_HEADING_CHARS:
+        return None
+
+    normalized = normalize_heading(stripped)
+    if normalized in _HEADING_LOOKUP:
+        return _HEADING_LOOKUP[normalized]
+
+    # Headings set apart by the layout or by capitals may extend a lexicon entry with heading words
+    words = normalized.split()
+    if not (layout_heading or stripped.isupper()) or len(words) > MAX_HEADING_WORDS:
+        return None
+    for prefix in _HEADING_PREFIXES:
+        prefix_words = prefix.split()
+        if words[:len(prefix_words)] == prefix_words and all(word in _HEADING_WORDS for word in words[len(prefix_words):]):
+            return _HEADING_LOOKUP[prefix]
+    return None
+
+def segment_text(text: str, layout_headings=None) -> list:
+    """
+    Split resume text into [(section, text)] in document order. Text before the first heading is the
+    "header" (name and contact details).
+    """
+    layout_headings = {line.strip() for line in layout_headings or ()}
+    sections = []
+    section = "header"
+    lines = []
+
+    for line in text.splitlines(keepends=True):
+        heading = classify_heading(line, line.strip() in layout_headings)
+        if heading:
+            if lines:
+                sections.append((section, "".join(lines)))
+            section = heading
+            lines = []
+        lines.append(line)
+
+    if lines:
+        sections.append((section, "".join(lines)))
+    return sections
+
+def select_sections(text: str, budget: int, count_tokens, truncate_to_tokens, layout_headings=None) -> str:
+    """
+    Assemble the prompt text from the highest-priority sections that fit `budget` tokens, kept in
+    document order. The last section that does not fit whole is truncated into the remaining budget.
+    Returns the text unchanged (truncated) when no sections are found.
+    """
+    sections = segment_text(text, layout_headings)
+    if len(sections) <= 1:
+        return truncate_to_tokens(text, budget)
+
+    ranked = sorted(
+        (index for index, (section, _) in enumerate(sections) if section in SECTION_PRIORITY),
+        key=lambda index: (SECTION_PRIORITY.index(sections[index][0]), index)
+    )
+
+    selected = {}
+    remaining = budget
+    for index in ranked:
+        section_text = sections[index][1]
+        tokens = count_tokens(section_text)
+        if tokens <= remaining:
+            selected[index] = section_text
+            remaining -= tokens
+        else:
+            selected[index] = truncate_to_tokens(section_text, remaining)
+            break
+
+    return "".join(selected[index] for index in sorted(selected))
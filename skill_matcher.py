@@ -0,0 +1,118 @@
+import os
+import json
+import threading
+from collections import deque
+
+# Local skill matcher. The taxonomy (canonical skill -> aliases, see skill_taxonomy.json) is compiled
+# once per process into an Aho-Corasick automaton over lowercased text, so every known skill is
+# found in a single pass regardless of taxonomy size. Terms listed as case-sensitive ("Go", "R",
+# "Spark") only match with their exact capitalisation, which keeps ordinary words from matching.
+DEFAULT_TAXONOMY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "skill_taxonomy.json")
+
+_automaton_lock = threading.Lock()
+_automaton = None
+
+def load_taxonomy(path: str = None) -> dict:
+    with open(path or os.environ.get("SKILL_TAXONOMY_PATH", DEFAULT_TAXONOMY_PATH), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def build_automaton(taxonomy: dict) -> dict:
+    """
+    Compile the taxonomy into goto/fail/output tables. Each output is (term_length, term, canonical).
+    """
+    case_sensitive = set(taxonomy.get("case_sensitive", ()))
+    goto = [{}]
+    output = [[]]
+    aliases = {}
+
+    for canonical, names in taxonomy["skills"].items():
+        for term in [canonical] + list(names):
+            key = term.lower()
+            aliases.setdefault(key, canonical)
+            state = 0
+            for char in key:
+                if char not in goto[state]:
+                    goto.append({})
+                    output.append([])
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            output[state].append((len(key), term if term in case_sensitive else None, canonical))
+
+    # Breadth-first failure links; each state inherits the outputs of its failure state
+    fail = [0] * len(goto)
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for char, next_state in goto[state].items():
+            queue.append(next_state)
+            fallback = fail[state]
+            while fallback and char not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[next_state] = goto[fallback].get(char, 0)
+            output[next_state].extend(output[fail[next_state]])
+
+    return {"goto": goto, "fail": fail, "output": output, "aliases": aliases}
+
+def get_automaton() -> dict:
+    global _automaton
+    with _automaton_lock:
+        if _automaton is None:
+            _automaton = build_automaton(load_taxonomy())
+        return _automaton
+
+def _is_boundary(text: str, start: int, end: int, exact: bool) -> bool:
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    # "C" must not match inside "C++" or "C#", and short exact terms not inside "Go-to-market"
+    joiners = "_-" if exact else "_"
+    if before.isalnum() or before in joiners or after.isalnum() or after in joiners:
+        return False
+    return not (text[end - 1].isalnum() and after in "+#")
+
+def find_skill_spans(text: str) -> list:
+    """
+    Leftmost-longest, non-overlapping skill matches in `text` as (start, end, canonical)
+    """
+    automaton = get_automaton()
+    goto, fail, output = automaton["goto"], automaton["fail"], automaton["output"]
+    lowered = text.lower()
+    # lower() can change the length of a few characters (e.g. "İ"); match on the original then
+    if len(lowered) != len(text):
+        lowered = "".join(char.lower()[0] for char in text)
+
+    matches = []
+    state = 0
+    for index, char in enumerate(lowered):
+        while state and char not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(char, 0)
+        for length, exact_term, canonical in output[state]:
+            start = index + 1 - length
+            if exact_term is not None and text[start:index + 1] != exact_term:
+                continue
+            if _is_boundary(text, start, index + 1, exact_term is not None):
+                matches.append((start, index + 1, canonical))
+
+    spans = []
+    last_end = 0
+    for start, end, canonical in sorted(matches, key=lambda match: (match[0], match[0] - match[1])):
+        if start >= last_end:
+            spans.append((start, end, canonical))
+            last_end = end
+    return spans
+
+def match_skills(text: str) -> dict:
+    """
+    Canonical skills found in `text` with their mention counts, in order of first mention
+    """
+    counts = {}
+    for _, _, canonical in find_skill_spans(text):
+        counts[canonical] = counts.get(canonical, 0) + 1
+    return counts
+
+def canonical_skill(name: str) -> str:
+    """
+    Canonical taxonomy name for a skill name or alias; unknown names are returned unchanged
+    """
+    stripped = name.strip()
+    return get_automaton()["aliases"].get(stripped.lower(), stripped)
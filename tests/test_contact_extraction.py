@@ -0,0 +1,21 @@
+import contact_extraction
+
+
+def test_title_and_skill_lines_are_not_locations():
+    header = "Jane Doe\nSoftware Engineer, Microsoft\nPython, Django\njane@example.com\n"
+    assert contact_extraction.find_location(header) == ""
+
+
+def test_city_country_on_a_contact_line():
+    header = "Jane Doe\njane@example.com | +44 20 7946 0958 | London, United Kingdom\n"
+    assert contact_extraction.find_location(header) == "London, United Kingdom"
+
+
+def test_city_state_line_and_labelled_location():
+    assert contact_extraction.find_location("Jane Doe\nAustin, TX\n") == "Austin, TX"
+    assert contact_extraction.find_location("Jane Doe\nLocation: Lyon, France\n") == "Lyon, France"
+
+
+def test_scan_stops_at_the_first_section():
+    header = "Jane Doe\njane@example.com\nEXPERIENCE\nEngineer | Austin, TX\n"
+    assert contact_extraction.find_location(header) == ""
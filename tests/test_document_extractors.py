@@ -0,0 +1,10 @@
+import pytest
+
+pytest.importorskip("pymupdf")
+
+import document_extractors  # noqa: E402
+
+
+def test_rtf_keeps_field_results():
+    rtf = rb'{\rtf1\ansi{\fonttbl{\f0 Arial;}}Portfolio: {\field{\*\fldinst{HYPERLINK "https://example.com"}}{\fldrslt{example.com}}}\par Email {\field{\fldinst HYPERLINK "mailto:jane@example.com"}{\fldrslt jane@example.com}}}'
+    assert document_extractors.extract_rtf_text(rtf) == "Portfolio: example.com\nEmail jane@example.com"
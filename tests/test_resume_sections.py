@@ -0,0 +1,38 @@
+from datetime import date
+
+import pytest
+
+import experience_dates
+import resume_sections
+
+
+@pytest.mark.parametrize("line", [
+    "Head of Education Programs, Acme",
+    "Data Protection Officer, Acme",
+    "Activities Director - Camp Co",
+    "EDUCATION COORDINATOR",
+])
+def test_job_titles_set_as_headings_are_not_sections(line):
+    assert resume_sections.classify_heading(line, layout_heading=True) is None
+
+
+@pytest.mark.parametrize("line, section", [
+    ("Experience", "experience"),
+    ("WORK EXPERIENCE", "experience"),
+    ("Professional Experience & Internships", "experience"),
+    ("Technical Skills Overview", "skills"),
+    ("Certifications & Licenses", "certifications"),
+])
+def test_layout_headings_extending_a_lexicon_entry(line, section):
+    assert resume_sections.classify_heading(line, layout_heading=True) == section
+
+
+def test_bold_job_title_stays_in_experience_section():
+    text = "Jane Doe\nEXPERIENCE\nHead of Education Programs, Acme\nJan 2019 - Present\nRan the teaching programs\n"
+
+    sections = resume_sections.segment_text(text, ["EXPERIENCE", "Head of Education Programs, Acme"])
+    assert [section for section, _ in sections] == ["header", "experience"]
+
+    experience = experience_dates.compute_experience(text, ["EXPERIENCE", "Head of Education Programs, Acme"], today=date(2024, 12, 1))
+    assert [position["title"] for position in experience["positions"]] == ["Head of Education Programs, Acme"]
+    assert experience["current_position"]["end"] == "present"
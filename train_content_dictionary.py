@@ -0,0 +1,120 @@
+import os
+import gzip
+import random
+import logging
+import argparse
+from datetime import datetime
+import zstandard
+from azure.cosmos import CosmosClient
+from azure.storage.blob import BlobServiceClient
+import content_storage
+
+# Trains a zstd dictionary for stored resume texts (see content_storage.py). A random sample of
+# stored texts is split into a training set and a held-out set; the report compares gzip, plain
+# zstd and dictionary zstd on the held-out texts so the gain is measured on texts the dictionary
+# has not seen. Uploaded dictionaries are immutable and versioned as <date>-<dictionary id>; set
+# CONTENT_ZSTD_DICTIONARY to the printed version to compress new texts with it.
+#
+#   python train_content_dictionary.py                 # train and report only
+#   python train_content_dictionary.py --upload
+MIN_TRAINING_SAMPLES = 100
+
+def sample_documents(container, sample_size: int, rng: random.Random) -> list:
+    """
+    Reservoir sample of `sample_size` stored documents (id and metadata only)
+    """
+    sample = []
+    query = "SELECT c.id, c.metadata FROM c"
+    for seen, document in enumerate(container.query_items(query=query, enable_cross_partition_query=True)):
+        if seen < sample_size:
+            sample.append(document)
+        else:
+            index = rng.randint(0, seen)
+            if index < sample_size:
+                sample[index] = document
+    return sample
+
+def load_texts(documents: list, get_blob_container) -> list:
+    texts = []
+    for document in documents:
+        try:
+            text = content_storage.load_content(document, get_blob_container)
+        except Exception as e:
+            logging.warning(f"Skipping document {document.get('id')}: {str(e)}")
+            continue
+        if text:
+            texts.append(text.encode("utf-8"))
+    return texts
+
+def compression_report(samples: list, dictionary: zstandard.ZstdCompressionDict, level: int) -> dict:
+    """
+    Total compressed sizes of `samples` with gzip, zstd and zstd with `dictionary`
+    """
+    plain = zstandard.ZstdCompressor(level=level)
+    trained = zstandard.ZstdCompressor(level=level, dict_data=dictionary)
+    report = {
+        "samples": len(samples),
+        "raw_bytes": sum(len(sample) for sample in samples),
+        "gzip_bytes": sum(len(gzip.compress(sample, 9)) for sample in samples),
+        "zstd_bytes": sum(len(plain.compress(sample)) for sample in samples),
+        "zstd_dictionary_bytes": sum(len(trained.compress(sample)) for sample in samples)
+    }
+    report["ratio_vs_gzip"] = round(report["gzip_bytes"] / max(report["zstd_dictionary_bytes"], 1), 2)
+    return report
+
+def dictionary_version(dictionary: zstandard.ZstdCompressionDict) -> str:
+    return f"{datetime.utcnow():%Y%m%d}-{dictionary.dict_id()}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a versioned zstd dictionary from stored resume texts")
+    parser.add_argument("--container", default=os.environ.get("COSMOS_CONTAINER_NAME", "resumes"))
+    parser.add_argument("--sample-size", type=int, default=5000)
+    parser.add_argument("--holdout", type=float, default=0.1, help="fraction of the sample kept out of training for the report")
+    parser.add_argument("--dict-size", type=int, default=112640, help="dictionary size in bytes")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--output", help="also write the dictionary to this file")
+    parser.add_argument("--upload", action="store_true", help="store the dictionary in the content container")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    endpoint = os.environ.get("COSMOS_ENDPOINT")
+    key = os.environ.get("COSMOS_KEY")
+    connection_string = os.environ.get("AzureWebJobsStorage")
+    if not endpoint or not key or not connection_string:
+        raise SystemExit("COSMOS_ENDPOINT, COSMOS_KEY and AzureWebJobsStorage must be set")
+
+    database = CosmosClient(endpoint, key).get_database_client(os.environ.get("COSMOS_DATABASE_NAME", "exploredb"))
+    blob_container = BlobServiceClient.from_connection_string(connection_string).get_container_client(os.environ.get("CONTENT_CONTAINER_NAME", "resume-content"))
+
+    rng = random.Random(args.seed)
+    documents = sample_documents(database.get_container_client(args.container), args.sample_size, rng)
+    texts = load_texts(documents, lambda: blob_container)
+    rng.shuffle(texts)
+
+    holdout_count = int(len(texts) * args.holdout)
+    holdout, training = texts[:holdout_count], texts[holdout_count:]
+    if len(training) < MIN_TRAINING_SAMPLES:
+        raise SystemExit(f"Only {len(training)} training texts found; at least {MIN_TRAINING_SAMPLES} are needed")
+
+    level = content_storage.get_compression_level()
+    dictionary = zstandard.train_dictionary(args.dict_size, training, level=level)
+    version = dictionary_version(dictionary)
+    logging.info(f"Trained dictionary {version} ({len(dictionary.as_bytes())} bytes) on {len(training)} texts")
+
+    if holdout:
+        logging.info(f"Held-out compression: {compression_report(holdout, dictionary, level)}")
+
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(dictionary.as_bytes())
+
+    if args.upload:
+        if not blob_container.exists():
+            blob_container.create_container()
+        # Versions are never overwritten: documents keep referencing the one they were written with
+        blob_container.upload_blob(content_storage.dictionary_blob_name(version), dictionary.as_bytes(), overwrite=False)
+        logging.info(f"Uploaded; set CONTENT_ZSTD_DICTIONARY={version} to compress new texts with it")
+
+if __name__ == "__main__":
+    main()